@@ -0,0 +1,278 @@
+"""Benchmark of users and login endpoints, app is driven in process over ASGI.
+
+Run from repository root:
+
+    python -m benchmarks.endpoints --requests 500 --concurrency 20 --save benchmarks/baselines/local.json
+    python -m benchmarks.endpoints --baseline benchmarks/baselines/local.json
+
+By default users are kept in memory (API_STORE_USERS_REPOSITORY=memory) and cache is in
+process, so results show framework, serialization and hashing overhead without database.
+With --baseline exit code is 1 if any scenario is slower than baseline by more than --threshold.
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import math
+import os
+import platform
+import sys
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+
+import orjson
+
+USERS_PREFIX = "/api/store/v1/users"
+LOGIN_PREFIX = "/api/store/v1/login"
+SCENARIOS = ("create", "read", "update", "delete", "login")
+USER_PASSWORD = "benchmark-password"
+
+
+class AsgiClient:
+    """Minimal http client calling ASGI app directly, without sockets and event loop hops."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def request(
+            self,
+            method: str,
+            path: str,
+            params: Optional[dict] = None,
+            body: bytes = b"",
+            headers: Optional[Dict[str, str]] = None
+    ) -> Tuple[int, bytes]:
+        request_headers = [(b"host", b"benchmark")]
+        if body:
+            request_headers.append((b"content-length", str(len(body)).encode()))
+        for name, value in (headers or {}).items():
+            request_headers.append((name.lower().encode(), value.encode()))
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": urlencode(params or {}).encode(),
+            "root_path": "",
+            "headers": request_headers,
+            "client": ("127.0.0.1", 50000),
+            "server": ("benchmark", 80),
+        }
+        request_sent = False
+        response_complete = asyncio.Event()
+        status_code = 500
+        chunks: List[bytes] = []
+
+        async def receive() -> dict:
+            nonlocal request_sent
+            if not request_sent:
+                request_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            await response_complete.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message: dict) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+                if not message.get("more_body", False):
+                    response_complete.set()
+
+        await self.app(scope, receive, send)
+        return status_code, b"".join(chunks)
+
+    async def json_request(self, method: str, path: str, payload: dict, params: Optional[dict] = None):
+        return await self.request(
+            method, path, params=params, body=orjson.dumps(payload), headers={"content-type": "application/json"}
+        )
+
+
+def _new_user() -> dict:
+    return {
+        "name": "Bench",
+        "lastname": None,
+        "surname": "Mark",
+        "country": "RU",
+        "user_email": f"bench-{uuid.uuid4().hex}@example.com",
+        "consent_to_mailing": False,
+        "user_pass": USER_PASSWORD,
+    }
+
+
+async def _create_user(client: AsgiClient) -> Tuple[str, str]:
+    user = _new_user()
+    status_code, body = await client.json_request("POST", f"{USERS_PREFIX}/create", user)
+    if status_code != 200:
+        raise RuntimeError(f"Failed to create benchmark user: {status_code} {body!r}")
+    return orjson.loads(body)["user_id"], user["user_email"]
+
+
+def _percentile(sorted_values: List[float], percent: float) -> float:
+    """Nearest-rank percentile of sorted values."""
+    return sorted_values[max(0, math.ceil(percent / 100 * len(sorted_values)) - 1)]
+
+
+async def _run_scenario(
+        total_requests: int,
+        concurrency: int,
+        make_request: Callable[[int], Awaitable[Tuple[int, bytes]]]
+) -> dict:
+    """Send total_requests by concurrency workers, request number is passed to make_request."""
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    next_request = 0
+
+    async def worker():
+        nonlocal next_request
+        while next_request < total_requests:
+            request_number = next_request
+            next_request += 1
+            started = time.perf_counter()
+            status_code, _ = await make_request(request_number)
+            latencies.append(time.perf_counter() - started)
+            if status_code >= 400:
+                errors[str(status_code)] = errors.get(str(status_code), 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": total_requests,
+        "errors": errors,
+        "throughput_rps": round(total_requests / elapsed, 2),
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(_percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 3),
+    }
+
+
+async def run_benchmarks(app, scenarios: List[str], total_requests: int, concurrency: int) -> Dict[str, dict]:
+    """Run scenarios one by one, users needed by scenario are created before it is measured."""
+    client = AsgiClient(app)
+    results: Dict[str, dict] = {}
+    await app.router.startup()
+    try:
+        for scenario in scenarios:
+            if scenario == "create":
+                async def make_request(_):
+                    return await client.json_request("POST", f"{USERS_PREFIX}/create", _new_user())
+            else:
+                seed_count = total_requests if scenario in ("delete", "login") else min(total_requests, 100)
+                seed_users = [await _create_user(client) for _ in range(seed_count)]
+                if scenario == "read":
+                    async def make_request(number, users=seed_users):
+                        return await client.request(
+                            "GET", f"{USERS_PREFIX}/read", params={"user_uuid": users[number % len(users)][0]}
+                        )
+                elif scenario == "update":
+                    async def make_request(number, users=seed_users):
+                        return await client.json_request(
+                            "PATCH",
+                            f"{USERS_PREFIX}/update",
+                            {"name": f"Bench{number}"},
+                            params={"user_uuid": users[number % len(users)][0]}
+                        )
+                elif scenario == "delete":
+                    async def make_request(number, users=seed_users):
+                        return await client.request(
+                            "DELETE", f"{USERS_PREFIX}/delete", params={"user_uuid": users[number][0]}
+                        )
+                else:
+                    async def make_request(number, users=seed_users):
+                        form = urlencode({"username": users[number][1], "password": USER_PASSWORD})
+                        return await client.request(
+                            "POST",
+                            f"{LOGIN_PREFIX}/token",
+                            body=form.encode(),
+                            headers={"content-type": "application/x-www-form-urlencoded"}
+                        )
+            results[scenario] = await _run_scenario(total_requests, concurrency, make_request)
+            print(f"{scenario:>8}: {results[scenario]}", file=sys.stderr)
+    finally:
+        await app.router.shutdown()
+    return results
+
+
+def compare_with_baseline(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float) -> List[str]:
+    """Describe scenarios with throughput or p95 worse than baseline by more than threshold share."""
+    regressions = []
+    for scenario, result in results.items():
+        if scenario not in baseline:
+            continue
+        expected = baseline[scenario]
+        if result["throughput_rps"] < expected["throughput_rps"] * (1 - threshold):
+            regressions.append(
+                f"{scenario}: throughput {result['throughput_rps']} rps, baseline {expected['throughput_rps']} rps"
+            )
+        if result["p95_ms"] > expected["p95_ms"] * (1 + threshold):
+            regressions.append(f"{scenario}: p95 {result['p95_ms']} ms, baseline {expected['p95_ms']} ms")
+    return regressions
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--repository", choices=("memory", "postgres"), default="memory")
+    parser.add_argument("--hash-rounds", type=int, default=12, help="bcrypt rounds, pinned to skip calibration")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--save", help="path to write results as json baseline")
+    parser.add_argument("--baseline", help="path of json baseline to compare results with")
+    parser.add_argument("--threshold", type=float, default=0.1, help="allowed regression, 0.1 is 10%%")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    # settings are read on import of app, so environment is prepared first
+    os.environ["API_STORE_USERS_REPOSITORY"] = args.repository
+    os.environ["API_STORE_PASSWORD_HASH_ROUNDS"] = str(args.hash_rounds)
+    os.environ.setdefault("API_STORE_CACHE_BACKEND", "memory")
+    # all requests come from one client, login throttling would reject most of them
+    os.environ.setdefault("API_STORE_LOGIN_IP_RATE_CAPACITY", str(args.requests * len(SCENARIOS)))
+    os.environ.setdefault("API_STORE_MAX_IN_FLIGHT_REQUESTS", str(max(args.concurrency, 256)))
+    os.environ.setdefault("API_STORE_LOG_LEVEL", args.log_level)
+
+    app = importlib.import_module("src.main").app
+
+    results = asyncio.run(run_benchmarks(app, args.scenarios, args.requests, args.concurrency))
+    report = {
+        "config": {
+            "repository": args.repository,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "hash_rounds": args.hash_rounds,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+    print(json.dumps(report, indent=2))
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w") as baseline_file:
+            json.dump(report, baseline_file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline["config"] != report["config"]:
+            print(f"Baseline was made with other config: {baseline['config']}", file=sys.stderr)
+        regressions = compare_with_baseline(results, baseline["results"], args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
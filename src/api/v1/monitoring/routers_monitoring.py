@@ -0,0 +1,50 @@
+import os
+
+from fastapi import APIRouter, Response
+from prometheus_client import (CONTENT_TYPE_LATEST, CollectorRegistry,
+                               generate_latest, multiprocess)
+
+from src.db import pg_session, replicas
+from src.pkg.hashing import hashing
+from src.pkg.metrics.metrics import update_pool_gauges
+
+monitoring_router = APIRouter()
+metrics_router = APIRouter()
+monitoring_tags: str = 'monitoring'
+
+
+@monitoring_router.get(
+    path='/pools',
+    tags=[monitoring_tags],
+    responses={
+        200: {
+            "description": "Live stats of db and hashing pools.",
+        },
+    }
+)
+async def get_pools_stats() -> dict:
+    return {
+        "db": pg_session.pool_status(pg_session.engine),
+        "db_circuit_breaker": pg_session.db_circuit_breaker.status(),
+        "replicas": replicas.replica_set.status() if replicas.replica_set is not None else [],
+        "hashing": hashing.hashing_pool.stats(),
+    }
+
+
+@metrics_router.get(
+    path='/metrics',
+    tags=[monitoring_tags],
+    include_in_schema=False
+)
+async def get_metrics() -> Response:
+    """Metrics in prometheus text format"""
+    update_pool_gauges(
+        db_pool_status=pg_session.pool_status(pg_session.engine),
+        hashing_pool_stats=hashing.hashing_pool.stats()
+    )
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        # several gunicorn workers, metrics of all of them are aggregated from shared directory
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(content=generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
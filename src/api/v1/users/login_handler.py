@@ -1,13 +1,12 @@
-from datetime import timedelta
-
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.security import OAuth2PasswordRequestForm
 from starlette import status
 
-from src.api.v1.users.resp_models import Token
+from src.api.v1.users.resp_models import RefreshTokenRequest, Token, TokenClaims
+from src.security.tokens import get_current_user
 from src.services.auth_users import AuthUser, get_auth_users_service
-from src.security.tokens import UserTokens
-from src.core.config import Settings
+from src.services.login_throttle import LoginThrottle, get_login_throttle
+from src.services.refresh_tokens import RefreshTokens, get_refresh_tokens_service
 
 login_router = APIRouter()
 login_tags: str = 'login'
@@ -28,29 +27,128 @@ login_tags: str = 'login'
                 }
             },
         },
+        429: {
+            "description": "Too many login attempts",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Too many login attempts, try again later."}
+                }
+            },
+        },
+        503: {
+            "description": "Refresh token could not be saved",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Tokens can not be issued now."}
+                }
+            },
+        },
     }
 )
 async def login_for_access_token(
+        request: Request,
         form_data: OAuth2PasswordRequestForm = Depends(),
-        auth_service: AuthUser = Depends(get_auth_users_service)
-):
+        auth_service: AuthUser = Depends(get_auth_users_service),
+        refresh_tokens_service: RefreshTokens = Depends(get_refresh_tokens_service),
+        login_throttle: LoginThrottle = Depends(get_login_throttle)
+) -> Token:
+    client_ip = request.client.host if request.client else "unknown"
+    rejection = await login_throttle.check(client_ip=client_ip, user_email=form_data.username)
+    if rejection is not None:
+        raise rejection
     user = await auth_service.authenticate_user(user_email=form_data.username, user_password=form_data.password)
     if type(user) == HTTPException:
         raise HTTPException(
             status_code=user.status_code,
-            detail=user.detail
+            detail=user.detail,
+            headers=user.headers
         )
     if not user:
+        await login_throttle.register_failure(user_email=form_data.username)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail='Incorrect user name or password.'
         )
-    access_token_expires = timedelta(minutes=Settings().ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token: str = UserTokens.create_access_token(
-        data={"sub": user.user_email, "user_id": str(user.user_id)},
-        expires_delta=access_token_expires
-    )
-    return Token(
-        access_token=access_token,
-        token_type="bearer"
-    )
+    await login_throttle.register_success(user_email=form_data.username)
+    tokens = await refresh_tokens_service.issue_tokens(user_id=user.user_id, user_email=user.user_email)
+    if type(tokens) == HTTPException:
+        raise HTTPException(status_code=tokens.status_code, detail=tokens.detail, headers=tokens.headers)
+    return tokens
+
+
+@login_router.post(
+    path='/refresh',
+    tags=[login_tags],
+    responses={
+        200: {
+            "description": "New access and refresh tokens.",
+        },
+        401: {
+            "description": "Invalid or revoked refresh token",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Refresh token was revoked."}
+                }
+            },
+        },
+        503: {
+            "description": "Refresh token could not be saved",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Tokens can not be issued now."}
+                }
+            },
+        },
+    }
+)
+async def refresh_access_token(
+        token_data: RefreshTokenRequest,
+        refresh_tokens_service: RefreshTokens = Depends(get_refresh_tokens_service)
+) -> Token:
+    """Exchange refresh token for new tokens, used refresh token is revoked"""
+    result = await refresh_tokens_service.refresh(refresh_token=token_data.refresh_token)
+    if type(result) == HTTPException:
+        raise HTTPException(status_code=result.status_code, detail=result.detail, headers=result.headers)
+    return result
+
+
+@login_router.post(
+    path='/revoke',
+    tags=[login_tags],
+    responses={
+        200: {
+            "description": "Refresh token revoked.",
+        },
+    }
+)
+async def revoke_refresh_token(
+        token_data: RefreshTokenRequest,
+        refresh_tokens_service: RefreshTokens = Depends(get_refresh_tokens_service)
+) -> None:
+    """Revoke refresh token, for example on logout"""
+    result = await refresh_tokens_service.revoke(refresh_token=token_data.refresh_token)
+    if type(result) == HTTPException:
+        raise HTTPException(status_code=result.status_code, detail=result.detail, headers=result.headers)
+
+
+@login_router.get(
+    path='/me',
+    tags=[login_tags],
+    response_model=TokenClaims,
+    responses={
+        200: {
+            "description": "Claims of access token.",
+        },
+        401: {
+            "description": "Invalid access token",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Could not validate credentials."}
+                }
+            },
+        },
+    }
+)
+async def read_current_user(current_user: TokenClaims = Depends(get_current_user)) -> TokenClaims:
+    """Get user of access token, verified claims are cached, so no db queries are made"""
+    return current_user
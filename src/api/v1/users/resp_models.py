@@ -1,10 +1,10 @@
 import datetime
 import uuid
-from typing import Optional, Union
+from typing import List, Optional, Union
 
-from pydantic import EmailStr
+from pydantic import EmailStr, conlist
 
-from src.core.config import Base
+from src.core.config import Base, settings
 
 
 class CreateUserRequest(Base):
@@ -26,6 +26,7 @@ class SelectUserResponse(Base):
     user_email: str
     date_registration: datetime.datetime
     consent_to_mailing: bool
+    version: int
 
 
 class UpdateUserRequest(Base):
@@ -37,16 +38,67 @@ class UpdateUserRequest(Base):
     consent_to_mailing: Optional[bool]
 
 
+class SelectUsersBatchRequest(Base):
+    user_ids: conlist(uuid.UUID, min_items=1, max_items=settings.USERS_BATCH_MAX_SIZE)
+
+
+class SelectUsersBatchResponse(Base):
+    # in order of requested ids, null for users that were not found
+    users: List[Optional[SelectUserResponse]]
+    not_found: List[uuid.UUID]
+
+
+class UsersPageResponse(Base):
+    users: List[SelectUserResponse]
+    next_cursor: Optional[str]
+
+
 class UserIdResponse(Base):
     user_id: uuid.UUID
 
 
+class UserVersionResponse(UserIdResponse):
+    version: int
+
+
+class EmailAvailabilityResponse(Base):
+    user_email: str
+    available: bool
+
+
 class SelectUserByEmailResponse(Base):
     user_id: uuid.UUID
     user_email: str
     hashed_password: str
 
 
+class BulkCreateUserResult(Base):
+    index: int
+    user_email: Optional[str]
+    # created, duplicate, invalid or error
+    status: str
+    user_id: Optional[uuid.UUID]
+    detail: Optional[str]
+
+
+class BulkCreateUsersResponse(Base):
+    created: int
+    duplicates: int
+    failed: int
+    results: List[BulkCreateUserResult]
+
+
 class Token(Base):
     access_token: str
     token_type: str
+    refresh_token: Optional[str]
+
+
+class RefreshTokenRequest(Base):
+    refresh_token: str
+
+
+class TokenClaims(Base):
+    user_id: uuid.UUID
+    user_email: str
+    exp: int
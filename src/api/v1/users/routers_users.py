@@ -1,17 +1,64 @@
+import csv
+import io
 import uuid
-from typing import Union
+from typing import AsyncIterator, List, Optional, Tuple, Union
 
-from fastapi import APIRouter, Depends, HTTPException
+import orjson
+from fastapi import (APIRouter, Depends, Header, HTTPException, Query, Request,
+                     Response)
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
 
-from src.api.v1.users.resp_models import (CreateUserRequest,
+from src.api.v1.users.resp_models import (BulkCreateUsersResponse,
+                                          CreateUserRequest,
+                                          EmailAvailabilityResponse,
                                           SelectUserResponse,
-                                          UpdateUserRequest, UserIdResponse)
-from src.services.users import UsersService, get_users_service
+                                          SelectUsersBatchRequest,
+                                          SelectUsersBatchResponse,
+                                          UpdateUserRequest, UserIdResponse,
+                                          UsersPageResponse,
+                                          UserVersionResponse)
+from src.core.config import settings
+from src.services.users import USER_COLUMNS, UsersService, get_users_service
 
 users_router = APIRouter()
 users_tags: str = 'users'
 
 
+def _make_etag(version: int) -> str:
+    return f'"{version}"'
+
+
+def _parse_etags(header: str) -> List[str]:
+    """Split If-Match / If-None-Match header to list of etags."""
+    return [etag.strip() for etag in header.split(",") if etag.strip()]
+
+
+def _etag_version(etag: str) -> Optional[int]:
+    """Version of user in etag made by _make_etag, None for other etags."""
+    value = etag[1:-1]
+    if len(etag) > 2 and etag[0] == etag[-1] == '"' and value.isascii() and value.isdigit():
+        return int(value)
+    return None
+
+
+def _etag_versions(header: str) -> List[int]:
+    """Versions of users in etags of header, weak etags are compared as strong, other etags are skipped."""
+    versions = (_etag_version(etag.removeprefix("W/")) for etag in _parse_etags(header))
+    return [version for version in versions if version is not None]
+
+
+def _strong_etag_versions(header: str) -> List[int]:
+    """Versions of users in strong etags of If-Match, weak etags never match there."""
+    versions = (_etag_version(etag) for etag in _parse_etags(header))
+    return [version for version in versions if version is not None]
+
+
+def _etag_matches(header: str, version: int) -> bool:
+    """Weak comparison of If-None-Match."""
+    return "*" in _parse_etags(header) or version in _etag_versions(header)
+
+
 @users_router.post(
     path='/create',
     tags=[users_tags],
@@ -44,16 +91,145 @@ async def create_user(
         consent_to_mailing=input_user_data.consent_to_mailing
     )
     if type(result) == HTTPException:
-        raise HTTPException(status_code=result.status_code, detail=result.detail)
+        raise HTTPException(status_code=result.status_code, detail=result.detail, headers=result.headers)
+    return result
+
+
+async def _iterate_users(
+        users: List[CreateUserRequest]
+) -> AsyncIterator[Tuple[int, Union[CreateUserRequest, str]]]:
+    for index, user in enumerate(users):
+        yield index, user
+
+
+async def _iterate_ndjson_users(
+        request: Request
+) -> AsyncIterator[Tuple[int, Union[CreateUserRequest, str]]]:
+    """Parse users from NDJSON request body while it is being received.
+
+    Only the unfinished line is buffered, line longer than BULK_CREATE_MAX_LINE_BYTES
+    stops the upload with 413, users of previous lines are already created.
+    """
+    index = 0
+    buffer = bytearray()
+    async for body_chunk in request.stream():
+        buffer += body_chunk
+        line_start = 0
+        while (line_end := buffer.find(b"\n", line_start)) != -1:
+            line = bytes(buffer[line_start:line_end])
+            line_start = line_end + 1
+            _check_line_length(len(line), index)
+            if line.strip():
+                yield index, _parse_user_line(line)
+                index += 1
+        del buffer[:line_start]
+        _check_line_length(len(buffer), index)
+    if buffer.strip():
+        yield index, _parse_user_line(bytes(buffer))
+
+
+def _check_line_length(length: int, index: int) -> None:
+    if length > settings.BULK_CREATE_MAX_LINE_BYTES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Line of user {index} is longer than {settings.BULK_CREATE_MAX_LINE_BYTES} bytes."
+        )
+
+
+def _parse_user_line(line: bytes) -> Union[CreateUserRequest, str]:
+    try:
+        return CreateUserRequest.parse_raw(line)
+    except (ValidationError, ValueError) as ex:
+        return str(ex)
+
+
+@users_router.post(
+    path='/bulk_create',
+    tags=[users_tags],
+    responses={
+        200: {
+            "description": "Users created, result is reported for every row.",
+        },
+        413: {
+            "description": "Too many users in request",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Too many users in request."}
+                }
+            },
+        },
+    }
+)
+async def bulk_create_users(
+        input_users_data: List[CreateUserRequest],
+        users_service: UsersService = Depends(get_users_service)
+) -> BulkCreateUsersResponse:
+    """Create users from JSON array, use /bulk_create/ndjson for big imports"""
+    if len(input_users_data) > settings.BULK_CREATE_MAX_JSON_ROWS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Too many users in request, max is {settings.BULK_CREATE_MAX_JSON_ROWS}."
+        )
+    return await users_service.bulk_create_users(users=_iterate_users(input_users_data))
+
+
+@users_router.post(
+    path='/bulk_create/ndjson',
+    tags=[users_tags],
+    responses={
+        200: {
+            "description": "Users created, result is reported for every line.",
+        },
+        413: {
+            "description": "Line is too long",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Line of user 0 is longer than 16384 bytes."}
+                }
+            },
+        },
+    }
+)
+async def bulk_create_users_ndjson(
+        request: Request,
+        users_service: UsersService = Depends(get_users_service)
+) -> BulkCreateUsersResponse:
+    """Create users from streamed NDJSON body, one user object per line"""
+    return await users_service.bulk_create_users(users=_iterate_ndjson_users(request))
+
+
+@users_router.get(
+    path='/email_available',
+    tags=[users_tags],
+    responses={
+        200: {
+            "description": "Is email free for registration.",
+        },
+    }
+)
+async def check_email_available(
+        user_email: str,
+        users_service: UsersService = Depends(get_users_service)
+) -> EmailAvailabilityResponse:
+    """Check that email is not used by any user"""
+    result: Union[EmailAvailabilityResponse, HTTPException] = await users_service.is_email_available(
+        user_email=user_email
+    )
+    if type(result) == HTTPException:
+        raise HTTPException(status_code=result.status_code, detail=result.detail, headers=result.headers)
     return result
 
 
 @users_router.get(
     path='/read',
     tags=[users_tags],
+    response_model=SelectUserResponse,
     responses={
         200: {
-            "description": "User selected.",
+            "description": "User selected, ETag header holds version of user.",
+        },
+        304: {
+            "description": "User was not changed since version from If-None-Match.",
         },
         404: {
             "description": "Not found",
@@ -67,22 +243,187 @@ async def create_user(
 )
 async def get_user(
         user_uuid: uuid.UUID,
+        if_none_match: Optional[str] = Header(default=None),
+        users_service: UsersService = Depends(get_users_service)
+) -> Response:
+    min_version = 0
+    if if_none_match is not None:
+        # client already saw this version, older copy of lagging replica is not compared
+        min_version = max(_etag_versions(if_none_match), default=0)
+        version: Union[int, None, HTTPException] = await users_service.get_user_version(
+            user_id=user_uuid,
+            min_version=min_version
+        )
+        if type(version) == HTTPException:
+            raise HTTPException(status_code=version.status_code, detail=version.detail, headers=version.headers)
+        if version is not None and _etag_matches(if_none_match, version):
+            return Response(status_code=304, headers={"ETag": _make_etag(version)})
+    # payload is already serialized json, it is sent without validation and serialization
+    result: Union[Tuple[bytes, int], HTTPException] = await users_service.get_user_json_by_id(
+        user_id=user_uuid,
+        min_version=min_version
+    )
+    if type(result) == HTTPException:
+        raise HTTPException(status_code=result.status_code, detail=result.detail, headers=result.headers)
+    payload, version = result
+    return Response(content=payload, media_type="application/json", headers={"ETag": _make_etag(version)})
+
+
+@users_router.post(
+    path='/read_batch',
+    tags=[users_tags],
+    response_model=SelectUsersBatchResponse,
+    responses={
+        200: {
+            "description": "Users in order of requested ids, missing users are null and listed in not_found.",
+        },
+    }
+)
+async def get_users_batch(
+        input_ids: SelectUsersBatchRequest,
+        users_service: UsersService = Depends(get_users_service)
+) -> Response:
+    """Get many users by ids with one db query"""
+    result: Union[bytes, HTTPException] = await users_service.get_users_json_by_ids(user_ids=input_ids.user_ids)
+    if type(result) == HTTPException:
+        raise HTTPException(status_code=result.status_code, detail=result.detail, headers=result.headers)
+    return Response(content=result, media_type="application/json")
+
+
+@users_router.get(
+    path='/list',
+    tags=[users_tags],
+    responses={
+        200: {
+            "description": "Page of users and cursor of next page.",
+        },
+        422: {
+            "description": "Invalid cursor",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Invalid cursor."}
+                }
+            },
+        },
+    }
+)
+async def list_users(
+        limit: int = Query(default=50, ge=1, le=settings.USERS_PAGE_MAX_LIMIT),
+        cursor: Optional[str] = None,
+        country: Optional[str] = None,
+        consent_to_mailing: Optional[bool] = None,
+        users_service: UsersService = Depends(get_users_service)
+) -> UsersPageResponse:
+    """Get users ordered by registration date, pass next_cursor to get next page"""
+    result: Union[UsersPageResponse, HTTPException] = await users_service.list_users(
+        limit=limit,
+        cursor=cursor,
+        country=country,
+        consent_to_mailing=consent_to_mailing
+    )
+    if type(result) == HTTPException:
+        raise HTTPException(status_code=result.status_code, detail=result.detail, headers=result.headers)
+    return result
+
+
+@users_router.get(
+    path='/search',
+    tags=[users_tags],
+    responses={
+        200: {
+            "description": "Best matching users and cursor of next page.",
+        },
+        422: {
+            "description": "Query is too short or invalid cursor",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "Invalid cursor."}
+                }
+            },
+        },
+    }
+)
+async def search_users(
+        q: str = Query(
+            min_length=settings.USERS_SEARCH_MIN_QUERY_LENGTH,
+            max_length=settings.USERS_SEARCH_MAX_QUERY_LENGTH
+        ),
+        limit: int = Query(default=20, ge=1, le=settings.USERS_PAGE_MAX_LIMIT),
+        cursor: Optional[str] = None,
         users_service: UsersService = Depends(get_users_service)
-) -> SelectUserResponse:
-    result: Union[SelectUserResponse, HTTPException] = await users_service.get_user_by_id(
-        user_id=user_uuid
+) -> UsersPageResponse:
+    """Search users by prefix or similar name, surname, lastname or country, pass next_cursor to get next page"""
+    search_text = q.strip()
+    if len(search_text) < settings.USERS_SEARCH_MIN_QUERY_LENGTH:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Search query must have at least {settings.USERS_SEARCH_MIN_QUERY_LENGTH} characters."
+        )
+    result: Union[UsersPageResponse, HTTPException] = await users_service.search_users(
+        search_text=search_text,
+        limit=limit,
+        cursor=cursor
     )
     if type(result) == HTTPException:
-        raise HTTPException(status_code=result.status_code, detail=result.detail)
+        raise HTTPException(status_code=result.status_code, detail=result.detail, headers=result.headers)
     return result
 
 
+async def _export_ndjson(users_batches: AsyncIterator) -> AsyncIterator[bytes]:
+    async for rows in users_batches:
+        yield b"".join(orjson.dumps(dict(row), default=str) + b"\n" for row in rows)
+
+
+async def _export_csv(users_batches: AsyncIterator) -> AsyncIterator[bytes]:
+    fieldnames = [column.key for column in USER_COLUMNS]
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames)
+    writer.writeheader()
+    async for rows in users_batches:
+        writer.writerows(dict(row) for row in rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+@users_router.get(
+    path='/export',
+    tags=[users_tags],
+    responses={
+        200: {
+            "description": "Stream of users in NDJSON or CSV.",
+        },
+    }
+)
+async def export_users(
+        export_format: str = Query(default="ndjson", alias="format", regex="^(ndjson|csv)$"),
+        country: Optional[str] = None,
+        consent_to_mailing: Optional[bool] = None,
+        users_service: UsersService = Depends(get_users_service)
+) -> StreamingResponse:
+    """Export all users matching filters without loading them into memory"""
+    users_batches = users_service.stream_users(country=country, consent_to_mailing=consent_to_mailing)
+    if export_format == "csv":
+        return StreamingResponse(_export_csv(users_batches), media_type="text/csv")
+    return StreamingResponse(_export_ndjson(users_batches), media_type="application/x-ndjson")
+
+
 @users_router.patch(
     path='/update',
     tags=[users_tags],
     responses={
         200: {
-            "description": "User was updated.",
+            "description": "User was updated, ETag header holds new version of user.",
+        },
+        412: {
+            "description": "No strong ETag from If-Match matches version of user",
+            "content": {
+                "application/json": {
+                    "example": {"detail": "User was changed."}
+                }
+            },
         },
         404: {
             "description": "Not found",
@@ -97,20 +438,30 @@ async def get_user(
 async def update_user(
         user_uuid: uuid.UUID,
         updated_params: UpdateUserRequest,
+        response: Response,
+        if_match: Optional[str] = Header(default=None),
         users_service: UsersService = Depends(get_users_service)
-) -> UserIdResponse:
+) -> UserVersionResponse:
+    """Update user, pass ETags of read user in If-Match to update only unchanged user, * matches any version"""
     updated_user_params = updated_params.dict(exclude_none=True)
     if updated_user_params == {}:
         raise HTTPException(status_code=422, detail="Mast be least one parameter for user update.")
-    user: Union[SelectUserResponse, HTTPException] = await users_service.get_user_by_id(user_id=user_uuid)
-    if user is None:
-        raise HTTPException(status_code=404, detail=f"User with id {user_uuid} not found.")
-    result: Union[UserIdResponse, HTTPException] = await users_service.update_user_by_id(
+    expected_versions = None
+    if if_match is not None and "*" not in _parse_etags(if_match):
+        expected_versions = _strong_etag_versions(if_match)
+        if not expected_versions:
+            raise HTTPException(status_code=412, detail="If-Match has no strong ETag of user.")
+    result: Union[UserVersionResponse, HTTPException] = await users_service.update_user_by_id(
         user_id=user_uuid,
+        expected_versions=expected_versions,
         **updated_user_params
     )
     if type(result) == HTTPException:
-        raise HTTPException(status_code=result.status_code, detail=result.detail)
+        if result.status_code == 404 and if_match is not None:
+            # If-Match condition is false for missing user, * included
+            raise HTTPException(status_code=412, detail=result.detail)
+        raise HTTPException(status_code=result.status_code, detail=result.detail, headers=result.headers)
+    response.headers["ETag"] = _make_etag(result.version)
     return result
 
 
@@ -137,5 +488,5 @@ async def delete_user(
 ) -> UserIdResponse:
     result: Union[UserIdResponse, HTTPException] = await users_service.delete_user_by_id(user_id=user_uuid)
     if type(result) == HTTPException:
-        raise HTTPException(status_code=result.status_code, detail=result.detail)
+        raise HTTPException(status_code=result.status_code, detail=result.detail, headers=result.headers)
     return result
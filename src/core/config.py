@@ -1,7 +1,16 @@
+from typing import List, Optional
+
 import orjson
-from pydantic import BaseSettings
+from pydantic import BaseSettings, validator
 from pydantic.main import BaseModel
 
+# asyncpg limit of bind parameters in one statement
+MAX_QUERY_PARAMETERS = 32767
+# values of one user in multi-row INSERT of bulk create
+BULK_CREATE_ROW_PARAMETERS = 10
+# bcrypt cost of hashes made before calibration, weaker cost would never upgrade them
+PASSWORD_HASH_ROUNDS_FLOOR = 12
+
 
 class Settings(BaseSettings):
     POSTGRES_USER: str = "app"
@@ -12,9 +21,137 @@ class Settings(BaseSettings):
     DRIVER: str = "postgresql+asyncpg"
     CONNECTION_STRING: str = f"{DRIVER}://{POSTGRES_USER}:{POSTGRES_PASS}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
 
+    # pool is per worker process: workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) <= max_connections
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 5
+    # seconds to wait for free connection of pool
+    DB_POOL_TIMEOUT: float = 5.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    # asyncpg prepared statements cached per connection, 0 disables cache
+    DB_STATEMENT_CACHE_SIZE: int = 100
+    # connection strings of read replicas, lookups are routed to them when set
+    READ_REPLICA_CONNECTION_STRINGS: List[str] = []
+    # "round_robin" or "least_connections"
+    READ_REPLICA_STRATEGY: str = "round_robin"
+    READ_REPLICA_HEALTH_CHECK_SECONDS: float = 5.0
+    # statements running longer are cancelled by postgres
+    DB_STATEMENT_TIMEOUT_MS: int = 5000
+    # db requests fail fast with 503 for DB_CIRCUIT_RESET_SECONDS after that many db failures in a row
+    DB_CIRCUIT_FAILURE_THRESHOLD: int = 5
+    DB_CIRCUIT_RESET_SECONDS: float = 10.0
+
+    # write events of users changes to outbox table and publish them to event bus
+    OUTBOX_ENABLED: bool = False
+    # "redis" stream or "memory" stand-in
+    EVENT_BUS_BACKEND: str = "redis"
+    EVENT_BUS_STREAM: str = "users-events"
+    # stream is trimmed to about that many last events
+    EVENT_BUS_STREAM_MAX_LEN: int = 100000
+    OUTBOX_BATCH_SIZE: int = 100
+    # pause of publisher when outbox is drained
+    OUTBOX_POLL_SECONDS: float = 0.5
+    # pause of publisher after publish error
+    OUTBOX_RETRY_SECONDS: float = 5.0
+
+    LOG_LEVEL: str = "INFO"
+    # json records with request id, plain text when false
+    LOG_JSON: bool = True
+    # records queued for writer thread, new records are dropped when queue is full
+    LOG_QUEUE_SIZE: int = 10000
+    # share of success records of hot read paths that is written
+    LOG_HOT_PATH_SAMPLE_RATE: float = 0.01
+
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    # gunicorn workers, 0 means one per cpu core
+    SERVER_WORKERS: int = 0
+    # import app once in master before forking workers
+    SERVER_PRELOAD: bool = True
+    # worker is restarted after that many requests plus random jitter, 0 disables restarts
+    SERVER_MAX_REQUESTS: int = 10000
+    SERVER_MAX_REQUESTS_JITTER: int = 1000
+    # seconds for in-flight requests to finish after SIGTERM before workers are killed
+    SERVER_GRACEFUL_TIMEOUT: int = 30
+    # worker silent for that many seconds is killed and restarted
+    SERVER_TIMEOUT: int = 60
+    SERVER_KEEPALIVE: int = 5
+    SERVER_BACKLOG: int = 2048
+
+    # "postgres" or "memory", memory keeps users in process and is meant for benchmarks and local runs
+    USERS_REPOSITORY: str = "postgres"
+
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 30
     SECRET_KEY: str = "something_secret_key"
     ALGORITHM_HASH: str = "HS256"
+    # login attempts are limited per ip and per account before any password check
+    LOGIN_IP_RATE_CAPACITY: int = 30
+    LOGIN_IP_RATE_PER_SECOND: float = 0.5
+    LOGIN_ACCOUNT_RATE_CAPACITY: int = 5
+    LOGIN_ACCOUNT_RATE_PER_SECOND: float = 0.1
+    # account is locked after threshold failures, lockout doubles with every next failure
+    LOGIN_LOCKOUT_THRESHOLD: int = 5
+    LOGIN_LOCKOUT_BASE_SECONDS: float = 1.0
+    LOGIN_LOCKOUT_MAX_SECONDS: float = 900.0
+    LOGIN_FAILURES_WINDOW_SECONDS: int = 3600
+
+    TOKEN_CACHE_MAX_SIZE: int = 10000
+    TOKEN_CACHE_TTL_SECONDS: int = 300
+
+    # requests over the limit get 503 with Retry-After, 0 disables limit
+    MAX_IN_FLIGHT_REQUESTS: int = 256
+    LOAD_SHEDDING_RETRY_AFTER_SECONDS: int = 1
+
+    REDIS_HOST: str = "localhost"
+    REDIS_PORT: int = 6379
+    # "redis" or "memory", memory storage is for tests and local runs
+    CACHE_BACKEND: str = "redis"
+    USER_CACHE_EXPIRE_SECONDS: int = 300
+
+    # "thread" or "process" executor for bcrypt hashing
+    HASHING_EXECUTOR: str = "thread"
+    HASHING_WORKERS: int = 4
+    HASHING_QUEUE_SIZE: int = 64
+    # bcrypt cost, when not set it is calibrated on startup to hash in PASSWORD_HASH_TARGET_MS;
+    # pin it in production so all workers use the same cost
+    PASSWORD_HASH_ROUNDS: Optional[int] = None
+    PASSWORD_HASH_TARGET_MS: int = 250
+    PASSWORD_HASH_MIN_ROUNDS: int = PASSWORD_HASH_ROUNDS_FLOOR
+    PASSWORD_HASH_MAX_ROUNDS: int = 15
+
+    # users of one multi-row INSERT, chunk * BULK_CREATE_ROW_PARAMETERS must fit MAX_QUERY_PARAMETERS
+    BULK_CREATE_CHUNK_SIZE: int = 500
+    BULK_CREATE_MAX_JSON_ROWS: int = 10000
+    # longer line of NDJSON upload is rejected with 413, it is kept in memory until its end is received
+    BULK_CREATE_MAX_LINE_BYTES: int = 16384
+
+    # bloom filter of registered emails answers logins and availability checks of unknown emails
+    # without db queries, users registered by other workers are picked up every refresh interval
+    EMAIL_FILTER_ENABLED: bool = False
+    EMAIL_FILTER_ERROR_RATE: float = 0.01
+    EMAIL_FILTER_REFRESH_SECONDS: float = 5.0
+    EMAIL_FILTER_REBUILD_SECONDS: float = 3600.0
+
+    USERS_PAGE_MAX_LIMIT: int = 100
+    USERS_BATCH_MAX_SIZE: int = 100
+    # shorter queries have no trigrams to use indexes
+    USERS_SEARCH_MIN_QUERY_LENGTH: int = 3
+    USERS_SEARCH_MAX_QUERY_LENGTH: int = 100
+    USERS_EXPORT_BATCH_SIZE: int = 1000
+
+    @validator("BULK_CREATE_CHUNK_SIZE")
+    def chunk_fits_query_parameters(cls, value: int) -> int:
+        max_chunk_size = MAX_QUERY_PARAMETERS // BULK_CREATE_ROW_PARAMETERS
+        if not 1 <= value <= max_chunk_size:
+            raise ValueError(f"must be from 1 to {max_chunk_size}, rows of chunk are inserted with one statement")
+        return value
+
+    @validator("PASSWORD_HASH_ROUNDS", "PASSWORD_HASH_MIN_ROUNDS")
+    def rounds_not_below_floor(cls, value: Optional[int]) -> Optional[int]:
+        if value is not None and value < PASSWORD_HASH_ROUNDS_FLOOR:
+            raise ValueError(f"must be at least {PASSWORD_HASH_ROUNDS_FLOOR}, existing hashes use this cost")
+        return value
 
     class Config:
         env_prefix = "API_STORE_"
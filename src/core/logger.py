@@ -0,0 +1,145 @@
+import os
+import queue
+import random
+import sys
+import threading
+import traceback
+from contextvars import ContextVar
+from typing import Dict, Union
+
+import orjson
+from loguru import logger
+
+from src.core.config import settings
+from src.pkg.metrics.metrics import LOG_RECORDS_DROPPED
+
+# set by RequestIdMiddleware for every http request
+request_id: ContextVar[Union[str, None]] = ContextVar("request_id", default=None)
+
+# success records of hot read paths, only LOG_HOT_PATH_SAMPLE_RATE share of them is written
+hot_path_logger = logger.bind(sampled=True)
+
+
+def _json_record(record: dict) -> bytes:
+    extra = {key: value for key, value in record["extra"].items() if key not in ("sampled", "request_id")}
+    entry = {
+        "time": record["time"].isoformat(),
+        "level": record["level"].name,
+        "message": record["message"],
+        "logger": record["name"],
+        "function": record["function"],
+        "line": record["line"],
+        "process": record["process"].id,
+        "request_id": record["extra"].get("request_id"),
+    }
+    if extra:
+        entry["extra"] = extra
+    if record["exception"] is not None:
+        entry["exception"] = "".join(traceback.format_exception(*record["exception"]))
+    return orjson.dumps(entry, default=str) + b"\n"
+
+
+def _text_record(record: dict) -> bytes:
+    line = (
+        f"{record['time']:%Y-%m-%d %H:%M:%S.%f} | {record['level'].name:<8} | "
+        f"{record['extra'].get('request_id') or '-'} | {record['name']}:{record['function']}:{record['line']} - "
+        f"{record['message']}\n"
+    )
+    if record["exception"] is not None:
+        line += "".join(traceback.format_exception(*record["exception"]))
+    return line.encode()
+
+
+class QueueSink:
+    """Loguru sink that puts records to bounded queue, writer thread formats and writes them.
+
+    Logging call on event loop never waits for io: when queue is full record is dropped
+    and counted, count of dropped records is logged by writer when queue has room again.
+    """
+
+    def __init__(self, max_size: int, as_json: bool = True, fd: Union[int, None] = None):
+        self.queue: queue.Queue = queue.Queue(maxsize=max_size)
+        self.format = _json_record if as_json else _text_record
+        self.fd = fd if fd is not None else sys.stderr.fileno()
+        self.dropped: Dict[str, int] = {}
+        self._dropped_lock = threading.Lock()
+        self._thread: Union[threading.Thread, None] = None
+
+    def __call__(self, message) -> None:
+        try:
+            self.queue.put_nowait(message.record)
+        except queue.Full:
+            level = message.record["level"].name
+            with self._dropped_lock:
+                self.dropped[level] = self.dropped.get(level, 0) + 1
+            LOG_RECORDS_DROPPED.labels(level=level).inc()
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Write records left in queue and stop writer thread."""
+        if self._thread is None:
+            return
+        self.queue.put(None)
+        self._thread.join(timeout=timeout)
+        self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            record = self.queue.get()
+            if record is None:
+                return
+            self._write(self.format(record))
+            if self.dropped and self.queue.qsize() < self.queue.maxsize // 2:
+                self._report_dropped()
+
+    def _report_dropped(self) -> None:
+        with self._dropped_lock:
+            dropped, self.dropped = self.dropped, {}
+        self._write(orjson.dumps({
+            "level": "WARNING",
+            "message": f"Log queue was full, dropped records by level: {dropped}",
+            "process": os.getpid(),
+        }) + b"\n")
+
+    def _write(self, line: bytes) -> None:
+        # one write per record, so lines of several workers writing to same pipe are not mixed
+        try:
+            os.write(self.fd, line)
+        except OSError:
+            pass
+
+
+def _add_request_id(record: dict) -> None:
+    # runs in thread of logging call, so request context is still available here
+    record["extra"].setdefault("request_id", request_id.get())
+
+
+def _sample(record: dict) -> bool:
+    return not record["extra"].get("sampled") or random.random() < settings.LOG_HOT_PATH_SAMPLE_RATE
+
+
+log_sink: Union[QueueSink, None] = None
+
+
+def setup_logging() -> None:
+    """Replace default loguru handler with queued sink, is called in every worker process."""
+    global log_sink
+    log_sink = QueueSink(max_size=settings.LOG_QUEUE_SIZE, as_json=settings.LOG_JSON)
+    log_sink.start()
+    logger.remove()
+    logger.configure(patcher=_add_request_id)
+    logger.add(log_sink, level=settings.LOG_LEVEL, filter=_sample, format="{message}", catch=True)
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and restore default handler for logs written after shutdown."""
+    global log_sink
+    if log_sink is None:
+        return
+    logger.remove()
+    log_sink.stop()
+    log_sink = None
+    logger.add(sys.stderr, level=settings.LOG_LEVEL)
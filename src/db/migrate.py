@@ -0,0 +1,78 @@
+"""One-off schema migration, run once before app of new version is started:
+
+    python -m src.db.migrate
+
+Every step is idempotent. Indexes are built with CREATE INDEX CONCURRENTLY, so
+users table stays writable while they are built.
+"""
+import asyncio
+
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, create_async_engine
+from sqlalchemy.schema import CreateIndex, CreateTable, Index
+
+from src.core.config import settings
+from src.db.pg_session import Base
+from src.pkg.storage import models  # noqa: F401, registers tables of models in metadata
+
+# columns added to existing tables after they were created
+ADD_COLUMNS = (
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1",
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()",
+)
+
+
+def _is_trigram_index(index: Index) -> bool:
+    return "gin_trgm_ops" in (index.dialect_options["postgresql"]["ops"] or {}).values()
+
+
+async def _drop_invalid_index(connection: AsyncConnection, index_name: str) -> None:
+    """Drop index left invalid by failed concurrent build, IF NOT EXISTS would keep it forever."""
+    result = await connection.execute(
+        text(
+            "SELECT 1 FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid "
+            "WHERE pg_class.relname = :index_name AND NOT pg_index.indisvalid"
+        ),
+        {"index_name": index_name}
+    )
+    if result.first() is not None:
+        logger.warning(f"Drop invalid index {index_name} left by failed build.")
+        await connection.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{index_name}"'))
+
+
+async def migrate(db_engine: AsyncEngine) -> None:
+    # CREATE INDEX CONCURRENTLY can not run inside transaction
+    async with db_engine.execution_options(isolation_level="AUTOCOMMIT").connect() as connection:
+        result = await connection.execute(text("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'"))
+        has_trigrams = result.first() is not None
+        if has_trigrams:
+            await connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        else:
+            logger.warning("Extension pg_trgm is not available, users search indexes are skipped, search matches only prefixes.")
+
+        for table in Base.metadata.sorted_tables:
+            await connection.execute(CreateTable(table, if_not_exists=True))
+        for statement in ADD_COLUMNS:
+            await connection.execute(text(statement))
+
+        for table in Base.metadata.sorted_tables:
+            for index in sorted(table.indexes, key=lambda item: item.name):
+                if _is_trigram_index(index) and not has_trigrams:
+                    continue
+                await _drop_invalid_index(connection, index.name)
+                await connection.execute(CreateIndex(index, if_not_exists=True))
+                logger.info(f"Index {index.name} is ready.")
+
+
+async def main() -> None:
+    # no statement timeout of app engine, index build on large table takes long
+    db_engine = create_async_engine(settings.CONNECTION_STRING)
+    try:
+        await migrate(db_engine)
+    finally:
+        await db_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
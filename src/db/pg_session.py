@@ -1,12 +1,202 @@
+import math
+import time
 from typing import Union
 
-from sqlalchemy.orm import declarative_base, sessionmaker
+import orjson
+from fastapi import HTTPException
+from loguru import logger
+from sqlalchemy import event, exc
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.sql.dml import UpdateBase
+
+from src.core.config import settings
+from src.db import replicas
+from src.pkg.circuit_breaker.circuit_breaker import CircuitBreaker
 
 Base = declarative_base()
 
+engine: Union[AsyncEngine, None] = None
 SessionLocal: Union[sessionmaker, None] = None
 
+# execution option of read-only statements that may be served by replica
+USE_REPLICA = "use_replica"
+
+db_circuit_breaker = CircuitBreaker(
+    failure_threshold=settings.DB_CIRCUIT_FAILURE_THRESHOLD,
+    reset_seconds=settings.DB_CIRCUIT_RESET_SECONDS
+)
+
+# sqlstate classes of connection problems, lack of resources and cancelled statements
+TRANSIENT_SQLSTATE_CLASSES = ("08", "53", "57")
+# statement was cancelled by statement_timeout
+QUERY_CANCELED_SQLSTATE = "57014"
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that measures how long checkouts wait for a connection.
+
+    Checkout timeouts are recorded to circuit_breaker, it is set by watch_engine
+    for primary engine only, so slow replica does not shed primary traffic.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.circuit_breaker: Union[CircuitBreaker, None] = None
+        self.wait_count = 0
+        self.wait_total_seconds = 0.0
+        self.wait_max_seconds = 0.0
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.circuit_breaker = self.circuit_breaker
+        return pool
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            if self.circuit_breaker is not None:
+                self.circuit_breaker.record_failure()
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            self.wait_count += 1
+            self.wait_total_seconds += waited
+            self.wait_max_seconds = max(self.wait_max_seconds, waited)
+
+
+class RoutingSession(Session):
+    """Session that sends opted-in reads to read replicas.
+
+    Statements with execution option use_replica=True go to a healthy replica.
+    Once the session wrote something, all statements go to primary, so reads
+    after writes within one request stay consistent.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        primary = super().get_bind(mapper=mapper, clause=clause, **kwargs)
+        if self._flushing or isinstance(clause, UpdateBase):
+            self.info["wrote"] = True
+            return primary
+        if clause is None or self.info.get("wrote") or replicas.replica_set is None:
+            return primary
+        if not clause.get_execution_options().get(USE_REPLICA):
+            return primary
+        replica = replicas.replica_set.choose()
+        return replica.sync_engine if replica is not None else primary
+
+
+def create_engine(connection_string: str) -> AsyncEngine:
+    """Create async engine with pool settings from config.
+
+    Every worker process owns its own pool, so workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW)
+    must stay below postgres max_connections.
+    """
+    return create_async_engine(
+        url=connection_string,
+        future=True,
+        echo=False,
+        poolclass=InstrumentedQueuePool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        # jsonb values hold uuids and datetimes
+        json_serializer=lambda value: orjson.dumps(value).decode(),
+        json_deserializer=orjson.loads,
+        connect_args={
+            "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+            "server_settings": {"statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS)},
+        }
+    )
+
+
+def watch_engine(db_engine: AsyncEngine, breaker: CircuitBreaker) -> None:
+    """Feed results of engine statements to circuit breaker.
+
+    Only connection problems and timeouts are failures, errors of invalid data
+    like duplicate email do not open circuit.
+    """
+    db_engine.sync_engine.pool.circuit_breaker = breaker
+
+    @event.listens_for(db_engine.sync_engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        breaker.record_success()
+
+    @event.listens_for(db_engine.sync_engine, "handle_error")
+    def _handle_error(context):
+        sqlstate = getattr(context.original_exception, "sqlstate", None) or ""
+        if context.is_disconnect or context.connection is None or sqlstate[:2] in TRANSIENT_SQLSTATE_CLASSES:
+            breaker.record_failure()
+
+
+def pool_status(db_engine: AsyncEngine) -> dict:
+    """Live stats of engine connection pool."""
+    pool: InstrumentedQueuePool = db_engine.pool
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "idle": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "wait_count": pool.wait_count,
+        "wait_avg_seconds": pool.wait_total_seconds / pool.wait_count if pool.wait_count else 0.0,
+        "wait_max_seconds": pool.wait_max_seconds,
+    }
+
+
+def _retry_after() -> str:
+    return str(max(math.ceil(db_circuit_breaker.retry_after()), 1))
+
+
+def db_error_response(ex: Exception, error_message: str) -> HTTPException:
+    """Response for failed db call, error of driver is only logged.
+
+    Statement timeout is 504 and exhausted pool or lost connection is 503, both
+    with Retry-After, other errors are 402 as before.
+    """
+    logger.error(f"{error_message}: {ex}")
+    sqlstate = getattr(getattr(ex, "orig", None), "sqlstate", None) or ""
+    if sqlstate == QUERY_CANCELED_SQLSTATE:
+        return HTTPException(
+            status_code=504,
+            detail="Database did not answer in time, try again later.",
+            headers={"Retry-After": _retry_after()}
+        )
+    if (isinstance(ex, (exc.TimeoutError, OSError))
+            or getattr(ex, "connection_invalidated", False)
+            or sqlstate[:2] in TRANSIENT_SQLSTATE_CLASSES):
+        return HTTPException(
+            status_code=503,
+            detail="Database is unavailable, try again later.",
+            headers={"Retry-After": _retry_after()}
+        )
+    return HTTPException(status_code=402, detail=error_message)
+
 
 async def get_db():
+    """Request-scoped unit of work: one session and one transaction per request.
+
+    Transaction is committed when request handler finished without errors and
+    rolled back otherwise. Write paths still commit by themselves before building
+    response, so client never gets success for data that was not committed.
+    Requests fail fast with 503 while db circuit is open.
+    """
+    if not db_circuit_breaker.allow_request():
+        raise HTTPException(
+            status_code=503,
+            detail="Database is unavailable, try again later.",
+            headers={"Retry-After": _retry_after()}
+        )
     async with SessionLocal() as db:
-        yield db
+        try:
+            yield db
+        except Exception:
+            await db.rollback()
+            raise
+        else:
+            if db.in_transaction():
+                await db.commit()
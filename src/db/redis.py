@@ -0,0 +1,9 @@
+from typing import Union
+
+from redis.asyncio import Redis
+
+redis: Union[Redis, None] = None
+
+
+async def get_redis() -> Redis:
+    return redis
@@ -0,0 +1,64 @@
+import asyncio
+import itertools
+from typing import List, Set, Union
+
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+
+class ReplicaSet:
+    """Read replicas with health checks and round robin or least connections choice."""
+
+    def __init__(self, engines: List[AsyncEngine], strategy: str = "round_robin"):
+        self.engines = engines
+        self.strategy = strategy
+        self.healthy: Set[int] = set(range(len(engines)))
+        self._counter = itertools.count()
+        self._health_task: Union[asyncio.Task, None] = None
+
+    def choose(self) -> Union[AsyncEngine, None]:
+        """Healthy replica for next read, None if all replicas are down."""
+        healthy_engines = [engine for index, engine in enumerate(self.engines) if index in self.healthy]
+        if not healthy_engines:
+            return None
+        if self.strategy == "least_connections":
+            return min(healthy_engines, key=lambda engine: engine.pool.checkedout())
+        return healthy_engines[next(self._counter) % len(healthy_engines)]
+
+    async def check_health(self, timeout: float) -> None:
+        for index, engine in enumerate(self.engines):
+            try:
+                async with engine.connect() as connection:
+                    await asyncio.wait_for(connection.execute(text("SELECT 1")), timeout=timeout)
+            except Exception as ex:
+                if index in self.healthy:
+                    logger.error(f"Read replica {engine.url.host} is unhealthy, reads go to primary: {ex}")
+                self.healthy.discard(index)
+            else:
+                if index not in self.healthy:
+                    logger.info(f"Read replica {engine.url.host} is healthy again.")
+                self.healthy.add(index)
+
+    async def _run_health_checks(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            await self.check_health(timeout=interval)
+
+    def start_health_checks(self, interval: float) -> None:
+        self._health_task = asyncio.create_task(self._run_health_checks(interval))
+
+    async def close(self) -> None:
+        if self._health_task is not None:
+            self._health_task.cancel()
+        for engine in self.engines:
+            await engine.dispose()
+
+    def status(self) -> List[dict]:
+        return [
+            {"host": engine.url.host, "healthy": index in self.healthy, "checked_out": engine.pool.checkedout()}
+            for index, engine in enumerate(self.engines)
+        ]
+
+
+replica_set: Union[ReplicaSet, None] = None
@@ -1,19 +1,41 @@
 import uvicorn
 from fastapi import FastAPI
 from fastapi.openapi.utils import get_openapi
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from fastapi.responses import ORJSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import sessionmaker
 from loguru import logger
+from redis.asyncio import Redis
 
-from api.metadata.tags_metadata import tags_metadata
+from src.api.metadata.tags_metadata import tags_metadata
+from src.api.v1.monitoring.routers_monitoring import (metrics_router,
+                                                      monitoring_router)
 from src.api.v1.users.routers_users import users_router
 from src.api.v1.users.login_handler import login_router
-from src.core.config import Settings
-from src.db import pg_session
+from src.core.config import settings
+from src.core.logger import setup_logging, shutdown_logging
+from src.db import pg_session, redis, replicas
+from src.pkg.cache_storage import storage
+from src.pkg.cache_storage.memory_storage import InMemoryStorage
+from src.pkg.cache_storage.redis_storage import RedisStorage
+from src.pkg.event_bus import publisher
+from src.pkg.event_bus.memory_publisher import InMemoryPublisher
+from src.pkg.event_bus.redis_publisher import RedisStreamPublisher
+from src.pkg.hashing import hashing
+from src.pkg.metrics.metrics import instrument_engine
+from src.pkg.load_shedding.middleware import ConcurrencyLimitMiddleware
+from src.pkg.metrics.middleware import MetricsMiddleware
+from src.pkg.request_id.middleware import RequestIdMiddleware
+from src.pkg.rate_limit import storage as rate_limit_storage
+from src.pkg.rate_limit.memory_storage import InMemoryRateLimitStorage
+from src.pkg.rate_limit.redis_storage import RedisRateLimitStorage
+from src.services.known_emails import known_emails
+from src.services.outbox import outbox_publisher
 
 app = FastAPI(
     docs_url='/api/store/openapi',
-    openapi_url='/api/store/openapi.json'
+    openapi_url='/api/store/openapi.json',
+    default_response_class=ORJSONResponse
 )
 
 
@@ -32,33 +54,110 @@ def custom_openapi():
 
 
 app.openapi = custom_openapi
+app.add_middleware(
+    ConcurrencyLimitMiddleware,
+    max_in_flight=settings.MAX_IN_FLIGHT_REQUESTS,
+    retry_after=settings.LOAD_SHEDDING_RETRY_AFTER_SECONDS,
+    exempt_paths=['/metrics']
+)
+# added after load shedding to count rejected requests too
+app.add_middleware(MetricsMiddleware)
+# outermost, so every log record of request carries its id
+app.add_middleware(RequestIdMiddleware)
 
 
 @app.on_event('startup')
 async def startup():
-    pg_engine = create_async_engine(
-        url=Settings().CONNECTION_STRING,
-        future=True,
-        echo=False
-    )
+    setup_logging()
+    pg_session.engine = pg_session.create_engine(settings.CONNECTION_STRING)
+    instrument_engine(pg_session.engine)
+    pg_session.watch_engine(pg_session.engine, pg_session.db_circuit_breaker)
     logger.info("Success create sqlalchemy engine.")
 
     pg_session.SessionLocal = sessionmaker(
-        bind=pg_engine,
+        bind=pg_session.engine,
         expire_on_commit=False,
         class_=AsyncSession,
+        sync_session_class=pg_session.RoutingSession,
         autocommit=False,
         autoflush=False
     )
 
+    if settings.READ_REPLICA_CONNECTION_STRINGS:
+        replica_engines = [
+            pg_session.create_engine(connection_string)
+            for connection_string in settings.READ_REPLICA_CONNECTION_STRINGS
+        ]
+        for replica_engine in replica_engines:
+            instrument_engine(replica_engine)
+        replicas.replica_set = replicas.ReplicaSet(engines=replica_engines, strategy=settings.READ_REPLICA_STRATEGY)
+        await replicas.replica_set.check_health(timeout=settings.READ_REPLICA_HEALTH_CHECK_SECONDS)
+        replicas.replica_set.start_health_checks(interval=settings.READ_REPLICA_HEALTH_CHECK_SECONDS)
+        logger.info(f"Success create read replicas: {replicas.replica_set.status()}")
+
+    if settings.CACHE_BACKEND == "memory":
+        storage.cache_storage = InMemoryStorage()
+        rate_limit_storage.rate_limit_storage = InMemoryRateLimitStorage()
+    else:
+        redis.redis = Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT)
+        storage.cache_storage = RedisStorage(redis=redis.redis)
+        rate_limit_storage.rate_limit_storage = RedisRateLimitStorage(redis=redis.redis)
+    logger.info(f"Success create {settings.CACHE_BACKEND} cache and rate limit storages.")
+
+    hashing_rounds = settings.PASSWORD_HASH_ROUNDS or hashing.calibrate_bcrypt_rounds(
+        target_seconds=settings.PASSWORD_HASH_TARGET_MS / 1000,
+        min_rounds=settings.PASSWORD_HASH_MIN_ROUNDS,
+        max_rounds=settings.PASSWORD_HASH_MAX_ROUNDS
+    )
+    hashing.configure_hashing_policy(rounds=hashing_rounds)
+    hashing.hashing_pool = hashing.HashingPool(
+        executor_type=settings.HASHING_EXECUTOR,
+        max_workers=settings.HASHING_WORKERS,
+        max_queue=settings.HASHING_QUEUE_SIZE
+    )
+    logger.info(f"Success create hashing pool: {hashing.hashing_pool.stats()}")
+
+    if settings.OUTBOX_ENABLED:
+        if settings.EVENT_BUS_BACKEND == "memory":
+            publisher.event_publisher = InMemoryPublisher(max_len=settings.EVENT_BUS_STREAM_MAX_LEN)
+        else:
+            if redis.redis is None:
+                redis.redis = Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT)
+            publisher.event_publisher = RedisStreamPublisher(
+                redis=redis.redis,
+                stream=settings.EVENT_BUS_STREAM,
+                max_len=settings.EVENT_BUS_STREAM_MAX_LEN
+            )
+        outbox_publisher.start()
+        logger.info(f"Success start outbox publisher to {settings.EVENT_BUS_BACKEND} event bus.")
+
+    if settings.EMAIL_FILTER_ENABLED and settings.USERS_REPOSITORY == "postgres":
+        await known_emails.rebuild()
+        known_emails.start()
+
 
 @app.on_event('shutdown')
 async def shutdown():
-    pass
+    known_emails.stop()
+    outbox_publisher.stop()
+    if publisher.event_publisher is not None:
+        await publisher.event_publisher.close()
+    if redis.redis is not None:
+        await redis.redis.close()
+    if hashing.hashing_pool is not None:
+        hashing.hashing_pool.shutdown()
+    if replicas.replica_set is not None:
+        await replicas.replica_set.close()
+    if pg_session.engine is not None:
+        await pg_session.engine.dispose()
+        logger.info("Success dispose sqlalchemy engine.")
+    shutdown_logging()
 
 
 app.include_router(users_router, prefix='/api/store/v1/users')
 app.include_router(login_router, prefix='/api/store/v1/login')
+app.include_router(monitoring_router, prefix='/api/store/v1/monitoring')
+app.include_router(metrics_router)
 
 if __name__ == "__main__":
     uvicorn.run(
@@ -0,0 +1,54 @@
+import time
+from typing import Dict, List, Tuple, Union
+
+from src.pkg.cache_storage.storage import CacheStorage
+
+
+def _is_newer(value: bytes, current: bytes) -> bool:
+    version, _, _ = value.partition(b":")
+    current_version, _, current_payload = current.partition(b":")
+    if int(current_version) != int(version):
+        return int(current_version) < int(version)
+    return not current_payload
+
+
+class InMemoryStorage(CacheStorage):
+    """Cache storage in process memory for tests and local runs."""
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[bytes, float]] = {}
+
+    async def get(self, key: str) -> Union[bytes, None]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expire_at = entry
+        if expire_at <= time.monotonic():
+            self._data.pop(key, None)
+            return None
+        return value
+
+    async def set(self, key: str, value: bytes, expire: int) -> None:
+        self._data[key] = (value, time.monotonic() + expire)
+
+    async def get_many(self, keys: List[str]) -> List[Union[bytes, None]]:
+        return [await self.get(key) for key in keys]
+
+    async def set_many(self, values: Dict[str, bytes], expire: int, raise_errors: bool = False) -> None:
+        for key, value in values.items():
+            await self.set(key, value, expire)
+
+    async def set_many_if_newer(self, values: Dict[str, bytes], expire: int) -> None:
+        for key, value in values.items():
+            current = await self.get(key)
+            if current is None or _is_newer(value, current):
+                await self.set(key, value, expire)
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            self._data.pop(key, None)
+
+    async def pop(self, key: str) -> Union[bytes, None]:
+        value = await self.get(key)
+        self._data.pop(key, None)
+        return value
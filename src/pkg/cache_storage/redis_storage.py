@@ -0,0 +1,94 @@
+from typing import Dict, List, Union
+
+from loguru import logger
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from src.pkg.cache_storage.storage import CacheStorage, CacheStorageError
+
+# ARGV[1] time to live, ARGV[i + 1] value of KEYS[i] starting with "<version>:"
+SET_IF_NEWER_SCRIPT = """
+for i, key in ipairs(KEYS) do
+    local value = ARGV[i + 1]
+    local version = tonumber(string.sub(value, 1, string.find(value, ':', 1, true) - 1))
+    local current = redis.call('GET', key)
+    local write = true
+    if current then
+        local separator = string.find(current, ':', 1, true)
+        local current_version = tonumber(string.sub(current, 1, separator - 1))
+        write = current_version < version or (current_version == version and #current == separator)
+    end
+    if write then
+        redis.call('SET', key, value, 'EX', tonumber(ARGV[1]))
+    end
+end
+return 0
+"""
+
+
+class RedisStorage(CacheStorage):
+    """Cache storage in redis.
+
+    Redis errors are logged and treated as cache misses, so unavailable cache
+    only sends requests to the primary storage.
+    """
+
+    def __init__(self, redis: Redis):
+        self.redis = redis
+        self._set_if_newer = redis.register_script(SET_IF_NEWER_SCRIPT)
+
+    async def get(self, key: str) -> Union[bytes, None]:
+        try:
+            return await self.redis.get(key)
+        except RedisError as ex:
+            logger.warning(f"Error while get key {key} from redis: {ex}")
+            return None
+
+    async def set(self, key: str, value: bytes, expire: int) -> None:
+        try:
+            await self.redis.set(key, value, ex=expire)
+        except RedisError as ex:
+            logger.warning(f"Error while set key {key} to redis: {ex}")
+
+    async def get_many(self, keys: List[str]) -> List[Union[bytes, None]]:
+        if not keys:
+            return []
+        try:
+            return await self.redis.mget(keys)
+        except RedisError as ex:
+            logger.warning(f"Error while get {len(keys)} keys from redis: {ex}")
+            return [None] * len(keys)
+
+    async def set_many(self, values: Dict[str, bytes], expire: int, raise_errors: bool = False) -> None:
+        if not values:
+            return
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key, value in values.items():
+                    pipe.set(key, value, ex=expire)
+                await pipe.execute()
+        except RedisError as ex:
+            logger.warning(f"Error while set {len(values)} keys to redis: {ex}")
+            if raise_errors:
+                raise CacheStorageError(f"Values were not saved to redis: {ex}") from ex
+
+    async def set_many_if_newer(self, values: Dict[str, bytes], expire: int) -> None:
+        if not values:
+            return
+        try:
+            await self._set_if_newer(keys=list(values), args=[expire, *values.values()])
+        except RedisError as ex:
+            logger.warning(f"Error while set {len(values)} versioned keys to redis: {ex}")
+
+    async def delete(self, *keys: str) -> None:
+        try:
+            await self.redis.delete(*keys)
+        except RedisError as ex:
+            logger.warning(f"Error while delete keys {keys} from redis: {ex}")
+
+    async def pop(self, key: str) -> Union[bytes, None]:
+        try:
+            return await self.redis.getdel(key)
+        except RedisError as ex:
+            logger.warning(f"Error while pop key {key} from redis: {ex}")
+            return None
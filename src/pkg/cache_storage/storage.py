@@ -0,0 +1,52 @@
+from abc import ABC, abstractmethod
+from typing import Dict, List, Union
+
+
+class CacheStorageError(Exception):
+    """Raised when value could not be saved and caller asked to know about it."""
+
+
+class CacheStorage(ABC):
+    """Interface of key-value storage for cached payloads."""
+
+    @abstractmethod
+    async def get(self, key: str) -> Union[bytes, None]:
+        """Get value by key, None if value is missing or expired."""
+
+    @abstractmethod
+    async def set(self, key: str, value: bytes, expire: int) -> None:
+        """Save value by key with time to live in seconds."""
+
+    @abstractmethod
+    async def get_many(self, keys: List[str]) -> List[Union[bytes, None]]:
+        """Get values by keys in keys order, None for missing values."""
+
+    @abstractmethod
+    async def set_many(self, values: Dict[str, bytes], expire: int, raise_errors: bool = False) -> None:
+        """Save values by keys with time to live in seconds.
+
+        Failed write is ignored like cache miss unless raise_errors is set, then CacheStorageError is raised.
+        """
+
+    @abstractmethod
+    async def set_many_if_newer(self, values: Dict[str, bytes], expire: int) -> None:
+        """Save values that start with b"<version>:" unless key holds newer version.
+
+        Value with nothing after version is tombstone: it keeps values of older
+        versions out and is replaced by value of the same version.
+        """
+
+    @abstractmethod
+    async def delete(self, *keys: str) -> None:
+        """Remove values by keys."""
+
+    @abstractmethod
+    async def pop(self, key: str) -> Union[bytes, None]:
+        """Atomically get value by key and remove it."""
+
+
+cache_storage: Union[CacheStorage, None] = None
+
+
+async def get_cache_storage() -> CacheStorage:
+    return cache_storage
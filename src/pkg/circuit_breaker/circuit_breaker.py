@@ -0,0 +1,47 @@
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Fail fast after consecutive failures of a dependency.
+
+    After failure_threshold failures in a row circuit opens and requests are
+    rejected for reset_seconds. Then circuit is half open: one trial request per
+    reset_seconds is let through, success closes circuit and failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self._next_attempt_at = 0.0
+
+    def allow_request(self) -> bool:
+        if self.state == CLOSED:
+            return True
+        now = time.monotonic()
+        if now < self._next_attempt_at:
+            return False
+        self.state = HALF_OPEN
+        self._next_attempt_at = now + self.reset_seconds
+        return True
+
+    def retry_after(self) -> float:
+        return max(self._next_attempt_at - time.monotonic(), 0.0)
+
+    def record_success(self) -> None:
+        self.state = CLOSED
+        self.failures = 0
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = OPEN
+            self._next_attempt_at = time.monotonic() + self.reset_seconds
+
+    def status(self) -> dict:
+        return {"state": self.state, "failures": self.failures, "retry_after": self.retry_after()}
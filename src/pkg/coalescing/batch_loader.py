@@ -0,0 +1,62 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Set
+
+
+class BatchLoader:
+    """DataLoader-style batching of loads by key.
+
+    Keys requested within one event loop tick are collected and loaded with one
+    load_many call, which returns mapping of found keys to values. Missing keys
+    resolve to None.
+    """
+
+    def __init__(
+            self,
+            load_many: Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]],
+            max_batch_size: int = 100
+    ):
+        self.load_many = load_many
+        self.max_batch_size = max_batch_size
+        self._pending: Dict[Hashable, asyncio.Future] = {}
+        self._scheduled = False
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def load(self, key: Hashable) -> Any:
+        future = self._pending.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._pending[key] = future
+            if not self._scheduled:
+                self._scheduled = True
+                loop.call_soon(self._dispatch)
+        # one cancelled caller must not cancel the result for other callers of the key
+        return await asyncio.shield(future)
+
+    def _dispatch(self) -> None:
+        pending, self._pending = self._pending, {}
+        self._scheduled = False
+        keys = list(pending)
+        for start in range(0, len(keys), self.max_batch_size):
+            batch = {key: pending[key] for key in keys[start:start + self.max_batch_size]}
+            task = asyncio.ensure_future(self._load_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _load_batch(self, batch: Dict[Hashable, asyncio.Future]) -> None:
+        try:
+            results = await self.load_many(list(batch))
+        except asyncio.CancelledError:
+            for future in batch.values():
+                future.cancel()
+            raise
+        except Exception as ex:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(ex)
+                    # mark exception retrieved in case every caller is gone
+                    future.exception()
+            return
+        for key, future in batch.items():
+            if not future.done():
+                future.set_result(results.get(key))
@@ -0,0 +1,17 @@
+import collections
+from typing import Deque, Dict, List, Union
+
+from src.pkg.event_bus.publisher import EventPublisher
+
+
+class InMemoryPublisher(EventPublisher):
+    """Event publisher keeping last events in process, stand-in for redis stream in local runs."""
+
+    def __init__(self, max_len: int):
+        self.events: Deque[Dict[str, Union[str, bytes]]] = collections.deque(maxlen=max_len)
+
+    async def publish_many(self, events: List[Dict[str, Union[str, bytes]]]) -> None:
+        self.events.extend(events)
+
+    async def close(self) -> None:
+        self.events.clear()
@@ -0,0 +1,21 @@
+from abc import ABC, abstractmethod
+from typing import Dict, List, Union
+
+
+class EventPublisher(ABC):
+    """Interface of event bus that delivers events to downstream consumers."""
+
+    @abstractmethod
+    async def publish_many(self, events: List[Dict[str, Union[str, bytes]]]) -> None:
+        """Publish events in order, raises if any of them may be not published."""
+
+    @abstractmethod
+    async def close(self) -> None:
+        """Release connections of publisher."""
+
+
+event_publisher: Union[EventPublisher, None] = None
+
+
+async def get_event_publisher() -> EventPublisher:
+    return event_publisher
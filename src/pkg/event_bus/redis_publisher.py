@@ -0,0 +1,31 @@
+from typing import Dict, List, Union
+
+from redis.asyncio import Redis
+
+from src.pkg.event_bus.publisher import EventPublisher
+
+
+class RedisStreamPublisher(EventPublisher):
+    """Event publisher to redis stream, consumers read it with consumer groups.
+
+    Events of batch are added with one pipeline round trip. Redis errors are not
+    caught, so caller keeps events and publishes them again.
+    """
+
+    def __init__(self, redis: Redis, stream: str, max_len: int):
+        self.redis = redis
+        self.stream = stream
+        self.max_len = max_len
+
+    async def publish_many(self, events: List[Dict[str, Union[str, bytes]]]) -> None:
+        if not events:
+            return
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for event in events:
+                # approximate trimming is O(1) amortized, stream keeps at least max_len events
+                pipe.xadd(self.stream, event, maxlen=self.max_len, approximate=True)
+            await pipe.execute()
+
+    async def close(self) -> None:
+        # redis client is shared with cache and closed on shutdown
+        pass
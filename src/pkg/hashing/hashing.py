@@ -1,13 +1,163 @@
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Tuple, Union
+
+from loguru import logger
 from passlib.context import CryptContext
 
+from src.pkg.metrics.metrics import observe_hashing
+
 pwd_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
 
 
+def calibrate_bcrypt_rounds(target_seconds: float, min_rounds: int, max_rounds: int) -> int:
+    """Pick the biggest bcrypt cost whose hash takes no more than target time on this machine.
+
+    Every next round doubles hashing time, so time of max cost is estimated from
+    the fastest of few hashes with min cost.
+    """
+    handler = pwd_context.handler("bcrypt").using(rounds=min_rounds)
+    min_rounds_seconds = float("inf")
+    for _ in range(3):
+        started = time.perf_counter()
+        handler.hash("calibration password")
+        min_rounds_seconds = min(min_rounds_seconds, time.perf_counter() - started)
+    rounds = min_rounds
+    while rounds < max_rounds and min_rounds_seconds * 2 ** (rounds + 1 - min_rounds) <= target_seconds:
+        rounds += 1
+    logger.info(
+        f"Calibrated bcrypt cost {rounds}: {min_rounds_seconds * 2 ** (rounds - min_rounds):.3f}s per hash, "
+        f"target {target_seconds:.3f}s."
+    )
+    return rounds
+
+
+def configure_hashing_policy(rounds: int) -> None:
+    """Hash new passwords with rounds cost, weaker hashes are reported as needing update.
+
+    Must be called before hashing pool is created, process workers copy the policy on start.
+    """
+    pwd_context.update(bcrypt__default_rounds=rounds, bcrypt__min_rounds=rounds)
+
+
+def _verify_password(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+def _get_pass_hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify_and_update(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+class HashingPoolSaturated(Exception):
+    """Raised when hashing pool has no free workers and its queue is full."""
+
+
+class HashingPool:
+    """Bounded pool of workers for password hashing.
+
+    Tasks over max_workers wait in queue, tasks over max_workers + max_queue are
+    rejected with HashingPoolSaturated instead of piling up on the event loop.
+    """
+
+    def __init__(self, executor_type: str = "thread", max_workers: int = 4, max_queue: int = 64):
+        if executor_type == "process":
+            self._executor: Executor = ProcessPoolExecutor(max_workers=max_workers)
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hasher")
+        self.executor_type = executor_type
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.pending = 0
+        self.rejected = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queue
+
+    def stats(self) -> dict:
+        return {
+            "executor_type": self.executor_type,
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_progress": min(self.pending, self.max_workers),
+            "queued": max(self.pending - self.max_workers, 0),
+            "rejected": self.rejected,
+        }
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        if self.pending >= self.capacity:
+            self.rejected += 1
+            logger.warning(f"Hashing pool is saturated: {self.stats()}")
+            raise HashingPoolSaturated("Too many password hashing tasks, try again later.")
+        self.pending += 1
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            self.pending -= 1
+            observe_hashing(func.__name__.lstrip("_"), time.perf_counter() - started)
+
+    async def map(self, func: Callable[[Any], Any], items: List[Any]) -> List[Any]:
+        """Run func for every item in batches of max_workers.
+
+        Batch jobs wait for free workers instead of being rejected, but never
+        take more than max_workers slots, so interactive calls keep their queue.
+        """
+        loop = asyncio.get_running_loop()
+        results: List[Any] = []
+        for start in range(0, len(items), self.max_workers):
+            batch = items[start:start + self.max_workers]
+            self.pending += len(batch)
+            started = time.perf_counter()
+            try:
+                results.extend(await asyncio.gather(
+                    *(loop.run_in_executor(self._executor, func, item) for item in batch)
+                ))
+            finally:
+                self.pending -= len(batch)
+                observe_hashing(f"{func.__name__.lstrip('_')}_batch", time.perf_counter() - started)
+        return results
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
+
+
+hashing_pool: Union[HashingPool, None] = None
+
+
 class Hasher:
     @staticmethod
     def verify_password(plain_password: str, hashed_password: str) -> bool:
-        return pwd_context.verify(plain_password, hashed_password)
+        return _verify_password(plain_password, hashed_password)
 
     @staticmethod
     def get_pass_hash(password: str) -> str:
-        return pwd_context.hash(password)
+        return _get_pass_hash(password)
+
+    @staticmethod
+    async def async_verify_password(plain_password: str, hashed_password: str) -> bool:
+        """Verify password in hashing pool without blocking event loop."""
+        return await hashing_pool.run(_verify_password, plain_password, hashed_password)
+
+    @staticmethod
+    async def async_verify_and_update(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Verify password and rehash it if hash does not match current policy.
+
+        Returns verification result and new hash, new hash is None if hash is up to date.
+        """
+        return await hashing_pool.run(_verify_and_update, plain_password, hashed_password)
+
+    @staticmethod
+    async def async_get_pass_hash(password: str) -> str:
+        """Hash password in hashing pool without blocking event loop."""
+        return await hashing_pool.run(_get_pass_hash, password)
+
+    @staticmethod
+    async def async_get_pass_hashes(passwords: List[str]) -> List[str]:
+        """Hash batch of passwords in parallel in hashing pool."""
+        return await hashing_pool.map(_get_pass_hash, passwords)
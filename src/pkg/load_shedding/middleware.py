@@ -0,0 +1,41 @@
+from typing import Iterable
+
+from fastapi.responses import ORJSONResponse
+from loguru import logger
+
+
+class ConcurrencyLimitMiddleware:
+    """ASGI middleware that rejects requests over max in-flight requests with 503.
+
+    Rejected request costs no db or hashing work, so overloaded worker does not
+    grow queues and memory while dependencies are slow.
+    """
+
+    def __init__(self, app, max_in_flight: int, retry_after: int, exempt_paths: Iterable[str] = ()):
+        self.app = app
+        self.max_in_flight = max_in_flight
+        self.retry_after = retry_after
+        self.exempt_paths = set(exempt_paths)
+        self.in_flight = 0
+        self.rejected = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.max_in_flight <= 0 or scope["path"] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+        if self.in_flight >= self.max_in_flight:
+            self.rejected += 1
+            if self.rejected % 100 == 1:
+                logger.warning(f"Load shedding: {self.in_flight} requests in flight, rejected {self.rejected}.")
+            response = ORJSONResponse(
+                status_code=503,
+                content={"detail": "Service is overloaded, try again later."},
+                headers={"Retry-After": str(self.retry_after)}
+            )
+            await response(scope, receive, send)
+            return
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
@@ -0,0 +1,116 @@
+import time
+from contextvars import ContextVar
+from typing import Union
+
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Latency of http requests by route.",
+    ["method", "route"]
+)
+REQUEST_COUNT = Counter(
+    "http_requests_total",
+    "Count of http requests by route and status code.",
+    ["method", "route", "status"]
+)
+REQUEST_DB_TIME = Histogram(
+    "http_request_db_duration_seconds",
+    "Time spent in db queries per http request.",
+    ["method", "route"]
+)
+REQUEST_DB_QUERIES = Histogram(
+    "http_request_db_queries",
+    "Count of db queries per http request.",
+    ["method", "route"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100)
+)
+REQUEST_HASHING_TIME = Histogram(
+    "http_request_hashing_duration_seconds",
+    "Time spent waiting for password hashing per http request.",
+    ["method", "route"]
+)
+DB_QUERY_LATENCY = Histogram(
+    "db_query_duration_seconds",
+    "Latency of db statements by operation.",
+    ["operation"]
+)
+PASSWORD_HASHING_LATENCY = Histogram(
+    "password_hashing_duration_seconds",
+    "Latency of password hashing calls including pool queue wait.",
+    ["operation"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 2.5, 5.0)
+)
+DB_POOL_CONNECTIONS = Gauge(
+    "db_pool_connections",
+    "Connections of db pool by state.",
+    ["state"]
+)
+DB_POOL_WAIT_MAX = Gauge(
+    "db_pool_wait_max_seconds",
+    "Max time of waiting for db pool checkout."
+)
+HASHING_POOL_TASKS = Gauge(
+    "hashing_pool_tasks",
+    "Tasks of hashing pool by state.",
+    ["state"]
+)
+LOG_RECORDS_DROPPED = Counter(
+    "log_records_dropped_total",
+    "Log records dropped because log queue was full.",
+    ["level"]
+)
+
+DB_OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH"}
+
+
+class RequestStats:
+    """Counters of one http request, filled by db and hashing hooks."""
+
+    __slots__ = ("db_queries", "db_seconds", "hashing_seconds")
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.hashing_seconds = 0.0
+
+
+request_stats: ContextVar[Union[RequestStats, None]] = ContextVar("request_stats", default=None)
+
+
+def observe_hashing(operation: str, seconds: float) -> None:
+    PASSWORD_HASHING_LATENCY.labels(operation=operation).observe(seconds)
+    stats = request_stats.get()
+    if stats is not None:
+        stats.hashing_seconds += seconds
+
+
+def instrument_engine(db_engine: AsyncEngine) -> None:
+    """Time every statement of engine and count queries of current request."""
+    sync_engine = db_engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context.query_started = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context.query_started
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+        if operation not in DB_OPERATIONS:
+            operation = "OTHER"
+        DB_QUERY_LATENCY.labels(operation=operation).observe(elapsed)
+        stats = request_stats.get()
+        if stats is not None:
+            stats.db_queries += 1
+            stats.db_seconds += elapsed
+
+
+def update_pool_gauges(db_pool_status: dict, hashing_pool_stats: dict) -> None:
+    for state in ("checked_out", "idle", "overflow"):
+        DB_POOL_CONNECTIONS.labels(state=state).set(db_pool_status[state])
+    DB_POOL_WAIT_MAX.set(db_pool_status["wait_max_seconds"])
+    for state in ("in_progress", "queued", "rejected"):
+        HASHING_POOL_TASKS.labels(state=state).set(hashing_pool_stats[state])
@@ -0,0 +1,43 @@
+import time
+
+from src.pkg.metrics.metrics import (REQUEST_COUNT, REQUEST_DB_QUERIES,
+                                     REQUEST_DB_TIME, REQUEST_HASHING_TIME,
+                                     REQUEST_LATENCY, RequestStats,
+                                     request_stats)
+
+
+class MetricsMiddleware:
+    """ASGI middleware that records latency, status and db usage per route."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = request_stats.set(stats)
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            request_stats.reset(token)
+            # route is set to scope by router, path template keeps labels cardinality low
+            route = scope.get("route")
+            labels = {"method": scope["method"], "route": route.path if route is not None else "unmatched"}
+            REQUEST_LATENCY.labels(**labels).observe(elapsed)
+            REQUEST_COUNT.labels(status=str(status_code), **labels).inc()
+            REQUEST_DB_TIME.labels(**labels).observe(stats.db_seconds)
+            REQUEST_DB_QUERIES.labels(**labels).observe(stats.db_queries)
+            REQUEST_HASHING_TIME.labels(**labels).observe(stats.hashing_seconds)
@@ -0,0 +1,49 @@
+import base64
+import datetime
+import uuid
+from typing import Any, List, Sequence, Tuple, Type, Union
+
+import orjson
+
+
+class InvalidCursor(Exception):
+    """Raised when pagination cursor can not be decoded."""
+
+
+def encode_cursor(values: List[Any]) -> str:
+    """Pack keyset values of the last returned row into opaque url-safe token."""
+    return base64.urlsafe_b64encode(orjson.dumps(values)).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, types: Sequence[Union[Type, Tuple[Type, ...]]]) -> List[Any]:
+    """Unpack cursor made by encode_cursor, every value must have json type of its position.
+
+    Cursor comes from client, so values are checked before objects are built from them.
+    """
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        values = orjson.loads(base64.urlsafe_b64decode(cursor + padding))
+    except (ValueError, orjson.JSONDecodeError) as ex:
+        raise InvalidCursor(f"Invalid cursor: {ex}") from ex
+    if not isinstance(values, list) or len(values) != len(types):
+        raise InvalidCursor("Invalid cursor.")
+    for value, value_type in zip(values, types):
+        # bool is int in python, but never a keyset value
+        if isinstance(value, bool) or not isinstance(value, value_type):
+            raise InvalidCursor("Invalid cursor.")
+    return values
+
+
+def cursor_datetime(value: str) -> datetime.datetime:
+    """Timestamp of cursor in UTC, naive one is local time like naive values asyncpg writes to timestamptz."""
+    try:
+        return datetime.datetime.fromisoformat(value).astimezone(datetime.timezone.utc)
+    except (ValueError, OverflowError) as ex:
+        raise InvalidCursor(f"Invalid cursor: {ex}") from ex
+
+
+def cursor_uuid(value: str) -> uuid.UUID:
+    try:
+        return uuid.UUID(value)
+    except ValueError as ex:
+        raise InvalidCursor(f"Invalid cursor: {ex}") from ex
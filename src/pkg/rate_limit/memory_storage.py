@@ -0,0 +1,59 @@
+import time
+from typing import Dict, List, Tuple
+
+from src.pkg.rate_limit.storage import RateLimitStorage
+
+
+class InMemoryRateLimitStorage(RateLimitStorage):
+    """Rate limit storage in process memory for tests and local runs."""
+
+    def __init__(self):
+        self._buckets: Dict[str, List[float]] = {}
+        self._failures: Dict[str, Tuple[int, float]] = {}
+        self._lockouts: Dict[str, float] = {}
+
+    async def consume(self, key: str, capacity: int, refill_per_second: float) -> float:
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.get(key, [float(capacity), now])
+        tokens = min(float(capacity), tokens + (now - updated_at) * refill_per_second)
+        retry_after = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            retry_after = (1 - tokens) / refill_per_second
+        self._buckets[key] = [tokens, now]
+        return retry_after
+
+    async def get_lockout(self, key: str) -> float:
+        locked_until = self._lockouts.get(key)
+        if locked_until is None:
+            return 0.0
+        left = locked_until - time.monotonic()
+        if left <= 0:
+            del self._lockouts[key]
+            return 0.0
+        return left
+
+    async def register_failure(
+            self,
+            key: str,
+            threshold: int,
+            base_seconds: float,
+            max_seconds: float,
+            window_seconds: int
+    ) -> float:
+        now = time.monotonic()
+        failures, expire_at = self._failures.get(key, (0, now))
+        if expire_at <= now:
+            failures = 0
+        failures += 1
+        self._failures[key] = (failures, now + window_seconds)
+        if failures < threshold:
+            return 0.0
+        lockout = min(max_seconds, base_seconds * 2 ** (failures - threshold))
+        self._lockouts[key] = now + lockout
+        return lockout
+
+    async def reset_failures(self, key: str) -> None:
+        self._failures.pop(key, None)
+        self._lockouts.pop(key, None)
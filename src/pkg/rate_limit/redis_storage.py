@@ -0,0 +1,103 @@
+from loguru import logger
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from src.pkg.rate_limit.storage import RateLimitStorage
+
+# token bucket in hash {tokens, ts}, redis server time keeps buckets consistent between workers
+CONSUME_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local updated_at = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * rate)
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    retry_after = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(retry_after)
+"""
+
+# KEYS[1] failures counter, KEYS[2] lockout flag
+REGISTER_FAILURE_SCRIPT = """
+local failures = redis.call('INCR', KEYS[1])
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[4]))
+local threshold = tonumber(ARGV[1])
+if failures < threshold then
+    return '0'
+end
+local lockout = math.min(tonumber(ARGV[3]), tonumber(ARGV[2]) * 2 ^ (failures - threshold))
+redis.call('SET', KEYS[2], '1', 'PX', math.max(1, math.floor(lockout * 1000)))
+return tostring(lockout)
+"""
+
+
+class RedisRateLimitStorage(RateLimitStorage):
+    """Rate limit storage in redis shared by all workers.
+
+    Redis errors are logged and requests are allowed, unavailable redis must not
+    block logins.
+    """
+
+    def __init__(self, redis: Redis):
+        self.redis = redis
+        self._consume = redis.register_script(CONSUME_SCRIPT)
+        self._register_failure = redis.register_script(REGISTER_FAILURE_SCRIPT)
+
+    # bucket hash, failures counter and lockout flag of one key are different redis types
+    @staticmethod
+    def _bucket_key(key: str) -> str:
+        return f"{key}:bucket"
+
+    @staticmethod
+    def _failures_key(key: str) -> str:
+        return f"{key}:failures"
+
+    @staticmethod
+    def _lockout_key(key: str) -> str:
+        return f"{key}:lockout"
+
+    async def consume(self, key: str, capacity: int, refill_per_second: float) -> float:
+        try:
+            return float(await self._consume(keys=[self._bucket_key(key)], args=[capacity, refill_per_second]))
+        except RedisError as ex:
+            logger.warning(f"Error while consume rate limit token {key} from redis: {ex}")
+            return 0.0
+
+    async def get_lockout(self, key: str) -> float:
+        try:
+            left_ms = await self.redis.pttl(self._lockout_key(key))
+        except RedisError as ex:
+            logger.warning(f"Error while get lockout {key} from redis: {ex}")
+            return 0.0
+        return left_ms / 1000 if left_ms > 0 else 0.0
+
+    async def register_failure(
+            self,
+            key: str,
+            threshold: int,
+            base_seconds: float,
+            max_seconds: float,
+            window_seconds: int
+    ) -> float:
+        try:
+            return float(await self._register_failure(
+                keys=[self._failures_key(key), self._lockout_key(key)],
+                args=[threshold, base_seconds, max_seconds, window_seconds]
+            ))
+        except RedisError as ex:
+            logger.warning(f"Error while register login failure {key} in redis: {ex}")
+            return 0.0
+
+    async def reset_failures(self, key: str) -> None:
+        try:
+            await self.redis.delete(self._failures_key(key), self._lockout_key(key))
+        except RedisError as ex:
+            logger.warning(f"Error while reset login failures {key} in redis: {ex}")
@@ -0,0 +1,43 @@
+from abc import ABC, abstractmethod
+from typing import Union
+
+
+class RateLimitStorage(ABC):
+    """Interface of storage for token buckets and failure lockouts."""
+
+    @abstractmethod
+    async def consume(self, key: str, capacity: int, refill_per_second: float) -> float:
+        """Take one token from bucket by key.
+
+        Returns 0 if token was taken, otherwise seconds until next token.
+        """
+
+    @abstractmethod
+    async def get_lockout(self, key: str) -> float:
+        """Seconds left of lockout by key, 0 if key is not locked."""
+
+    @abstractmethod
+    async def register_failure(
+            self,
+            key: str,
+            threshold: int,
+            base_seconds: float,
+            max_seconds: float,
+            window_seconds: int
+    ) -> float:
+        """Count failure by key and lock key after threshold failures.
+
+        Lockout doubles with every failure over threshold up to max_seconds.
+        Returns seconds of lockout, 0 if key is not locked.
+        """
+
+    @abstractmethod
+    async def reset_failures(self, key: str) -> None:
+        """Forget failures and lockout by key."""
+
+
+rate_limit_storage: Union[RateLimitStorage, None] = None
+
+
+async def get_rate_limit_storage() -> RateLimitStorage:
+    return rate_limit_storage
@@ -0,0 +1,36 @@
+import re
+import uuid
+
+from src.core.logger import request_id
+
+REQUEST_ID_HEADER = b"x-request-id"
+# request id from client is kept only if it is short and safe to put to logs
+VALID_REQUEST_ID = re.compile(rb"^[A-Za-z0-9._-]{1,64}$")
+
+
+class RequestIdMiddleware:
+    """ASGI middleware that sets request id for logs and returns it in X-Request-ID header."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        current_request_id = next(
+            (value for name, value in scope["headers"] if name == REQUEST_ID_HEADER and VALID_REQUEST_ID.match(value)),
+            uuid.uuid4().hex.encode()
+        )
+        token = request_id.set(current_request_id.decode())
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(REQUEST_ID_HEADER, current_request_id)]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            request_id.reset(token)
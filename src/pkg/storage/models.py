@@ -1,8 +1,9 @@
 import datetime
 import uuid
 
-from sqlalchemy import Boolean, Column, String
-from sqlalchemy.dialects.postgresql import TIMESTAMP, UUID
+from sqlalchemy import (BigInteger, Boolean, Column, Index, Integer, String,
+                        func, text)
+from sqlalchemy.dialects.postgresql import JSONB, TIMESTAMP, UUID
 
 from src.db.pg_session import Base
 
@@ -10,13 +11,69 @@ from src.db.pg_session import Base
 class Users(Base):
     __tablename__ = "users"
 
-    user_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4())
+    user_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     name = Column(String, nullable=False)
     lastname = Column(String, nullable=True)
     surname = Column(String, nullable=False)
     country = Column(String, nullable=False)
-    user_email = Column(String, nullable=False, unique=True)
-    date_registration = Column(TIMESTAMP(timezone=True), nullable=False, default=datetime.datetime.now())
+    user_email = Column(String, nullable=False)
+    date_registration = Column(TIMESTAMP(timezone=True), nullable=False, default=datetime.datetime.now)
     consent_to_mailing = Column(Boolean, nullable=False)
     hashed_password = Column(String, nullable=False)
-# todo indexes
\ No newline at end of file
+    # incremented on every update, used as ETag of user
+    version = Column(Integer, nullable=False, default=1, server_default=text("1"))
+    # set on every update of user data, known emails filter picks up changed emails by it
+    updated_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
+
+    # indexes are built by src.db.migrate concurrently, without blocking writes to table
+    __table_args__ = (
+        # emails are unique regardless of case, lookups go through lower(user_email)
+        Index("ix_users_user_email_lower", func.lower(user_email), unique=True, postgresql_concurrently=True),
+        # keyset pagination and export order
+        Index("ix_users_date_registration_user_id", date_registration, user_id, postgresql_concurrently=True),
+        Index(
+            "ix_users_country_date_registration_user_id",
+            country,
+            date_registration,
+            user_id,
+            postgresql_concurrently=True,
+        ),
+        Index(
+            "ix_users_consent_date_registration_user_id",
+            consent_to_mailing,
+            date_registration,
+            user_id,
+            postgresql_concurrently=True,
+        ),
+        Index("ix_users_updated_at", updated_at, postgresql_concurrently=True),
+        # users search, trigram indexes serve both similarity (%) and prefix ILIKE conditions
+        # column names are given explicitly, columns get them only after class is created
+        *(
+            Index(
+                f"ix_users_{column_name}_trgm",
+                column,
+                postgresql_using="gin",
+                postgresql_ops={column_name: "gin_trgm_ops"},
+                postgresql_concurrently=True,
+            )
+            for column_name, column in (
+                ("name", name),
+                ("surname", surname),
+                ("lastname", lastname),
+                ("country", country),
+            )
+        ),
+    )
+
+
+class OutboxEvents(Base):
+    """Events of users changes, written in transaction of change and drained by outbox publisher."""
+    __tablename__ = "outbox_events"
+
+    # publishing order
+    event_id = Column(BigInteger, primary_key=True, autoincrement=True)
+    event_type = Column(String, nullable=False)
+    aggregate_id = Column(UUID(as_uuid=True), nullable=False)
+    payload = Column(JSONB, nullable=False)
+    created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
+
@@ -1,13 +1,24 @@
+import time
+from collections import OrderedDict
 from datetime import timedelta, datetime
-from typing import Optional
+from typing import Optional, Tuple
 
-from jose import jwt
+from fastapi import Depends, HTTPException
+from fastapi.security import OAuth2PasswordBearer
+from jose import JWTError, jwt
+from pydantic import ValidationError
+from starlette import status
 
-from src.core.config import Settings
+from src.api.v1.users.resp_models import TokenClaims
+from src.core.config import settings
+
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/store/v1/login/token")
+
+REFRESH_TOKEN_TYPE = "refresh"
 
 
 class UserTokens:
-    """Class for realize creating access JWT."""
+    """Class for realize creating and verifying access JWT."""
     @staticmethod
     def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
         """Func for create JWT from something users data and secret key."""
@@ -16,7 +27,80 @@ class UserTokens:
         if expires_delta:
             expire = datetime.utcnow() + expires_delta
         else:
-            expire = datetime.utcnow() + timedelta(minutes=Settings().ACCESS_TOKEN_EXPIRE_MINUTES)
+            expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
         to_encode_data.update({"exp": expire})
-        encoded_jwt = jwt.encode(claims=to_encode_data, key=Settings().SECRET_KEY, algorithm=Settings().ALGORITHM_HASH)
+        encoded_jwt = jwt.encode(claims=to_encode_data, key=settings.SECRET_KEY, algorithm=settings.ALGORITHM_HASH)
         return encoded_jwt
+
+    @staticmethod
+    def create_refresh_token(data: dict, token_id: str) -> str:
+        """Func for create long-lived refresh JWT, token_id is the key of token in revocation store."""
+        to_encode_data = data.copy()
+        expire = datetime.utcnow() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+        to_encode_data.update({"exp": expire, "jti": token_id, "type": REFRESH_TOKEN_TYPE})
+        return jwt.encode(claims=to_encode_data, key=settings.SECRET_KEY, algorithm=settings.ALGORITHM_HASH)
+
+    @staticmethod
+    def decode_refresh_token(token: str) -> dict:
+        """Verify signature and expiration of refresh JWT and return its payload."""
+        payload = jwt.decode(token=token, key=settings.SECRET_KEY, algorithms=[settings.ALGORITHM_HASH])
+        if payload.get("type") != REFRESH_TOKEN_TYPE or not payload.get("jti"):
+            raise JWTError("Token is not a refresh token.")
+        return payload
+
+    @staticmethod
+    def decode_access_token(token: str) -> TokenClaims:
+        """Verify signature and expiration of JWT and return its claims."""
+        payload = jwt.decode(token=token, key=settings.SECRET_KEY, algorithms=[settings.ALGORITHM_HASH])
+        if payload.get("type") == REFRESH_TOKEN_TYPE:
+            raise JWTError("Refresh token can not be used as access token.")
+        return TokenClaims(user_email=payload.get("sub"), user_id=payload.get("user_id"), exp=payload.get("exp"))
+
+
+class TokenClaimsCache:
+    """Bounded LRU cache of verified token claims.
+
+    Entry lives for ttl seconds but never longer than the token itself.
+    """
+
+    def __init__(self, max_size: int, ttl: int):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[TokenClaims, float]]" = OrderedDict()
+
+    def get(self, token: str) -> Optional[TokenClaims]:
+        entry = self._data.get(token)
+        if entry is None:
+            return None
+        claims, expire_at = entry
+        if expire_at <= time.time():
+            del self._data[token]
+            return None
+        self._data.move_to_end(token)
+        return claims
+
+    def set(self, token: str, claims: TokenClaims) -> None:
+        self._data[token] = (claims, min(time.time() + self.ttl, claims.exp))
+        self._data.move_to_end(token)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+
+token_claims_cache = TokenClaimsCache(max_size=settings.TOKEN_CACHE_MAX_SIZE, ttl=settings.TOKEN_CACHE_TTL_SECONDS)
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> TokenClaims:
+    """Dependency for authenticated endpoints, costs no db queries."""
+    claims = token_claims_cache.get(token)
+    if claims is not None:
+        return claims
+    try:
+        claims = UserTokens.decode_access_token(token)
+    except (JWTError, ValidationError):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials.",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    token_claims_cache.set(token, claims)
+    return claims
@@ -0,0 +1,79 @@
+import multiprocessing
+import os
+
+from gunicorn.app.base import BaseApplication
+from loguru import logger
+from prometheus_client import multiprocess
+from uvicorn.workers import UvicornWorker
+
+from src.core.config import settings
+
+
+class StoreUvicornWorker(UvicornWorker):
+    """Uvicorn worker of gunicorn with uvloop event loop and httptools parser."""
+
+    CONFIG_KWARGS = {
+        "loop": "uvloop",
+        "http": "httptools",
+    }
+
+
+def workers_count() -> int:
+    """Workers from settings, 0 means one worker per cpu core."""
+    return settings.SERVER_WORKERS or multiprocessing.cpu_count()
+
+
+def on_child_exit(server, worker) -> None:
+    """Drop metrics files of exited worker when prometheus multiprocess mode is on."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(worker.pid)
+
+
+class StoreApplication(BaseApplication):
+    """Gunicorn application serving app with options from settings.
+
+    App is imported once in master when preload is on and workers are forked with it,
+    db engine, redis and hashing pool are created in every worker on startup and are
+    disposed on shutdown, after in-flight requests are drained on SIGTERM.
+    """
+
+    def __init__(self, options: dict):
+        self.options = options
+        super().__init__()
+
+    def load_config(self) -> None:
+        for key, value in self.options.items():
+            if key in self.cfg.settings and value is not None:
+                self.cfg.set(key, value)
+
+    def load(self):
+        # import only here, so with preload app is imported once in master process
+        from src.main import app
+        return app
+
+
+def gunicorn_options() -> dict:
+    return {
+        "bind": f"{settings.SERVER_HOST}:{settings.SERVER_PORT}",
+        "workers": workers_count(),
+        "worker_class": "src.server.StoreUvicornWorker",
+        "preload_app": settings.SERVER_PRELOAD,
+        # recycle workers to limit memory creep, jitter keeps them from restarting at once
+        "max_requests": settings.SERVER_MAX_REQUESTS,
+        "max_requests_jitter": settings.SERVER_MAX_REQUESTS_JITTER,
+        "graceful_timeout": settings.SERVER_GRACEFUL_TIMEOUT,
+        "timeout": settings.SERVER_TIMEOUT,
+        "keepalive": settings.SERVER_KEEPALIVE,
+        "backlog": settings.SERVER_BACKLOG,
+        "child_exit": on_child_exit,
+    }
+
+
+def run() -> None:
+    options = gunicorn_options()
+    logger.info(f"Starting {options['workers']} workers on {options['bind']}.")
+    StoreApplication(options=options).run()
+
+
+if __name__ == "__main__":
+    run()
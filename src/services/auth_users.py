@@ -1,59 +1,126 @@
-from functools import lru_cache
 from typing import Union
 
 from fastapi import Depends, HTTPException
-from sqlalchemy import select
+from sqlalchemy import func, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from loguru import logger
 
 from src.api.v1.users.resp_models import SelectUserByEmailResponse
-from src.db.pg_session import get_db
+from src.db import pg_session
+from src.core.config import settings
+from src.db.pg_session import USE_REPLICA, db_error_response, get_db
+from src.pkg.coalescing.single_flight import SingleFlight
 from src.pkg.storage import models
-from src.pkg.hashing.hashing import Hasher
+from src.services.known_emails import known_emails
+from src.services.memory_users import InMemoryUsersService, in_memory_users_storage
+from src.pkg.hashing.hashing import Hasher, HashingPoolSaturated
+
+
+# concurrent logins with the same email share one query
+_auth_users_flight = SingleFlight()
+
+
+def _user_by_email_query(email_key: str):
+    """Select user credentials by lowercased email, served by ix_users_user_email_lower."""
+    return (
+        select(models.Users.user_id, models.Users.user_email, models.Users.hashed_password)
+        .where(func.lower(models.Users.user_email) == email_key)
+        .execution_options(**{USE_REPLICA: True})
+    )
+
+
+async def _fetch_user_by_email(email_key: str) -> Union[SelectUserByEmailResponse, None]:
+    """Select user credentials in own session, the call is shared by concurrent logins."""
+    async with pg_session.SessionLocal() as db_session:
+        result = await db_session.execute(_user_by_email_query(email_key))
+        selected_user = result.mappings().first()
+    if not selected_user:
+        return None
+    return SelectUserByEmailResponse(**selected_user)
 
 
 class AuthUser:
     def __init__(self, db: AsyncSession):
         self.db_session = db
 
-    async def __get_user_by_email(
+    async def _get_user_by_email(
             self,
             user_email: str
     ) -> Union[SelectUserByEmailResponse, None, HTTPException]:
+        email_key = user_email.lower()
+        if not known_emails.might_exist(email_key):
+            return None
         try:
-            query = select(models.Users).where(models.Users.user_email == user_email)
-            result = await self.db_session.execute(query)
-            selected_user: models.Users = result.scalars().first()
-            if not selected_user:
-                return None
-            return SelectUserByEmailResponse(
-                user_id=selected_user.user_id,
-                user_email=selected_user.user_email,
-                hashed_password=selected_user.hashed_password
-            )
-        except Exception as ex: # todo разные ошибки
-            error_message = f"Error while select user by email = {user_email}: {ex}"
-            logger.error(error_message)
-            return HTTPException(status_code=402, detail=error_message)
-        finally:
-            await self.db_session.close()
+            return await _auth_users_flight.do(email_key, lambda: _fetch_user_by_email(email_key))
+        except Exception as ex:
+            return db_error_response(ex, f"Error while select user by email = {user_email}")
 
     async def authenticate_user(
             self,
             user_email: str,
             user_password: str
     ) -> Union[HTTPException, bool, SelectUserByEmailResponse]:
-        user = await self.__get_user_by_email(user_email=user_email)
+        user = await self._get_user_by_email(user_email=user_email)
         if not user:
             return False
-        if not Hasher.verify_password(plain_password=user_password, hashed_password=user.hashed_password):
+        if type(user) == HTTPException:
+            return user
+        try:
+            is_valid_password, new_hashed_password = await Hasher.async_verify_and_update(
+                plain_password=user_password,
+                hashed_password=user.hashed_password
+            )
+        except HashingPoolSaturated as ex:
+            logger.warning(f"Rejected authenticate user {user_email}: {ex}")
+            return HTTPException(status_code=503, detail=str(ex))
+        if not is_valid_password:
             return False
+        if new_hashed_password is not None:
+            await self._rehash_password(user=user, new_hashed_password=new_hashed_password)
         return user
 
+    async def _rehash_password(self, user: SelectUserByEmailResponse, new_hashed_password: str) -> None:
+        """Save hash made with current hashing policy, failure does not fail login."""
+        try:
+            query = (
+                update(models.Users)
+                .where(models.Users.user_id == user.user_id)
+                .where(models.Users.hashed_password == user.hashed_password)
+                .values(hashed_password=new_hashed_password)
+                .execution_options(synchronize_session=False)
+            )
+            await self.db_session.execute(query)
+            await self.db_session.commit()
+            logger.info(f"Rehashed password of user {user.user_id} with current policy.")
+        except Exception as ex:
+            await self.db_session.rollback()
+            logger.error(f"Error while rehash password of user {user.user_id}: {ex}")
+
+
+class InMemoryAuthUser(AuthUser):
+    """Authenticate users of in-memory repository, hashing works the same as with db."""
+
+    def __init__(self, users_service: InMemoryUsersService):
+        self.users_service = users_service
+
+    async def _get_user_by_email(
+            self,
+            user_email: str
+    ) -> Union[SelectUserByEmailResponse, None, HTTPException]:
+        return await self.users_service.get_user_credentials(user_email=user_email)
+
+    async def _rehash_password(self, user: SelectUserByEmailResponse, new_hashed_password: str) -> None:
+        await self.users_service.set_password_hash(
+            user_id=user.user_id,
+            old_hashed_password=user.hashed_password,
+            new_hashed_password=new_hashed_password
+        )
+        logger.info(f"Rehashed password of user {user.user_id} with current policy.")
 
 
-@lru_cache()
 def get_auth_users_service(
         db_session: AsyncSession = Depends(get_db)
 ) -> AuthUser:
+    if settings.USERS_REPOSITORY == "memory":
+        return InMemoryAuthUser(users_service=InMemoryUsersService(storage=in_memory_users_storage))
     return AuthUser(db=db_session)
@@ -0,0 +1,95 @@
+import asyncio
+import datetime
+import time
+from typing import Optional, Union
+
+from loguru import logger
+from sqlalchemy import func, select
+
+from src.core.config import settings
+from src.db import pg_session
+from src.pkg.bloom.bloom_filter import BloomFilter
+from src.pkg.storage import models
+
+# changed users are selected with overlap, so clock skew between workers does not lose them
+REFRESH_OVERLAP = datetime.timedelta(seconds=60)
+
+
+class KnownEmails:
+    """In-memory Bloom filter of registered emails.
+
+    Email that is not in filter is definitely not registered and can be answered
+    without db query. Filter is loaded on startup, updated on create and update,
+    refreshed with users created or updated by other workers every few seconds
+    and rebuilt periodically to drop deleted and replaced emails. Until it is loaded every
+    email is treated as possibly registered.
+    """
+
+    def __init__(self):
+        self._filter: Optional[BloomFilter] = None
+        self._watermark: Optional[datetime.datetime] = None
+        self._rebuilt_at = 0.0
+        self._task: Union[asyncio.Task, None] = None
+
+    def might_exist(self, user_email: str) -> bool:
+        if self._filter is None:
+            return True
+        return self._filter.might_contain(user_email.lower())
+
+    def add(self, user_email: str) -> None:
+        if self._filter is not None:
+            self._filter.add(user_email.lower())
+
+    async def rebuild(self) -> None:
+        async with pg_session.SessionLocal() as db_session:
+            users_count = (await db_session.execute(select(func.count()).select_from(models.Users))).scalar_one()
+            watermark = (await db_session.execute(select(func.now()))).scalar_one()
+            # twice the capacity leaves room for registrations until next rebuild
+            new_filter = BloomFilter(
+                capacity=max(users_count * 2, 10000),
+                error_rate=settings.EMAIL_FILTER_ERROR_RATE
+            )
+            result = await db_session.stream(select(func.lower(models.Users.user_email)))
+            async for emails in result.scalars().partitions(settings.USERS_EXPORT_BATCH_SIZE):
+                for user_email in emails:
+                    new_filter.add(user_email)
+        self._filter = new_filter
+        self._watermark = watermark
+        self._rebuilt_at = time.monotonic()
+        logger.info(f"Success rebuild known emails filter of {users_count} users.")
+
+    async def refresh(self) -> None:
+        """Add emails of users created or updated since last refresh."""
+        async with pg_session.SessionLocal() as db_session:
+            query = (
+                select(func.lower(models.Users.user_email), models.Users.updated_at)
+                .where(models.Users.updated_at >= self._watermark - REFRESH_OVERLAP)
+            )
+            result = await db_session.execute(query)
+            for user_email, updated_at in result:
+                self._filter.add(user_email)
+                self._watermark = max(self._watermark, updated_at)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(settings.EMAIL_FILTER_REFRESH_SECONDS)
+            try:
+                if time.monotonic() - self._rebuilt_at >= settings.EMAIL_FILTER_REBUILD_SECONDS:
+                    await self.rebuild()
+                else:
+                    await self.refresh()
+            except Exception as ex:
+                # stale filter could reject new users, so lookups go to db until filter is rebuilt
+                self._filter = None
+                self._rebuilt_at = 0.0
+                logger.error(f"Error while update known emails filter, filter is disabled until rebuild: {ex}")
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+
+
+known_emails = KnownEmails()
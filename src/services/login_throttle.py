@@ -0,0 +1,81 @@
+import math
+from typing import Union
+
+from fastapi import Depends, HTTPException
+from loguru import logger
+from starlette import status
+
+from src.core.config import settings
+from src.pkg.rate_limit.storage import RateLimitStorage, get_rate_limit_storage
+
+
+class LoginThrottle:
+    """Brute-force protection of login.
+
+    Every attempt takes a token from per-ip and per-account buckets, failed
+    attempts lock account with exponential lockout. Checks run before any db
+    query or password hashing.
+    """
+
+    def __init__(self, storage: RateLimitStorage):
+        self.storage = storage
+
+    @staticmethod
+    def _ip_key(client_ip: str) -> str:
+        return f"login:ip:{client_ip}"
+
+    @staticmethod
+    def _account_key(user_email: str) -> str:
+        return f"login:account:{user_email.lower()}"
+
+    @staticmethod
+    def _too_many_attempts(retry_after: float) -> HTTPException:
+        return HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many login attempts, try again later.",
+            headers={"Retry-After": str(math.ceil(retry_after))}
+        )
+
+    async def check(self, client_ip: str, user_email: str) -> Union[None, HTTPException]:
+        """Return 429 if login attempt must be rejected."""
+        account_key = self._account_key(user_email)
+        lockout = await self.storage.get_lockout(account_key)
+        if lockout:
+            return self._too_many_attempts(lockout)
+        retry_after = await self.storage.consume(
+            self._ip_key(client_ip),
+            capacity=settings.LOGIN_IP_RATE_CAPACITY,
+            refill_per_second=settings.LOGIN_IP_RATE_PER_SECOND
+        )
+        if retry_after:
+            logger.warning(f"Login rate limit of ip {client_ip} exceeded.")
+            return self._too_many_attempts(retry_after)
+        retry_after = await self.storage.consume(
+            account_key,
+            capacity=settings.LOGIN_ACCOUNT_RATE_CAPACITY,
+            refill_per_second=settings.LOGIN_ACCOUNT_RATE_PER_SECOND
+        )
+        if retry_after:
+            logger.warning(f"Login rate limit of account {user_email} exceeded.")
+            return self._too_many_attempts(retry_after)
+        return None
+
+    async def register_failure(self, user_email: str) -> None:
+        lockout = await self.storage.register_failure(
+            self._account_key(user_email),
+            threshold=settings.LOGIN_LOCKOUT_THRESHOLD,
+            base_seconds=settings.LOGIN_LOCKOUT_BASE_SECONDS,
+            max_seconds=settings.LOGIN_LOCKOUT_MAX_SECONDS,
+            window_seconds=settings.LOGIN_FAILURES_WINDOW_SECONDS
+        )
+        if lockout:
+            logger.warning(f"Account {user_email} is locked for {lockout} seconds after failed logins.")
+
+    async def register_success(self, user_email: str) -> None:
+        await self.storage.reset_failures(self._account_key(user_email))
+
+
+def get_login_throttle(
+        storage: RateLimitStorage = Depends(get_rate_limit_storage)
+) -> LoginThrottle:
+    return LoginThrottle(storage=storage)
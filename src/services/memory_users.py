@@ -0,0 +1,410 @@
+import datetime
+import re
+import uuid
+from typing import AsyncIterator, Dict, FrozenSet, List, Optional, Tuple, Union
+
+import orjson
+from fastapi import HTTPException
+from pydantic import EmailStr
+from loguru import logger
+
+from src.api.v1.users.resp_models import (BulkCreateUserResult,
+                                          BulkCreateUsersResponse,
+                                          CreateUserRequest,
+                                          EmailAvailabilityResponse,
+                                          SelectUserByEmailResponse,
+                                          SelectUserResponse, UserIdResponse,
+                                          UserVersionResponse,
+                                          UsersPageResponse)
+from src.core.config import settings
+from src.core.logger import hot_path_logger
+from src.pkg.hashing.hashing import Hasher, HashingPoolSaturated
+from src.pkg.pagination.cursor import (InvalidCursor, cursor_datetime,
+                                      cursor_uuid, decode_cursor,
+                                      encode_cursor)
+from src.services.abstract.abstract_services import CrudService
+
+USER_FIELDS = (
+    "user_id",
+    "name",
+    "lastname",
+    "surname",
+    "country",
+    "user_email",
+    "date_registration",
+    "consent_to_mailing",
+    "version",
+)
+
+
+class InMemoryUsersStorage:
+    """Users table kept in process: rows by id and unique index on lower(user_email)."""
+
+    def __init__(self):
+        self.users: Dict[uuid.UUID, dict] = {}
+        self.user_ids_by_email: Dict[str, uuid.UUID] = {}
+
+    def insert(self, row: dict) -> bool:
+        """Insert row if email is not taken, the check and insert run without awaits in between."""
+        email_key = row["user_email"].lower()
+        if email_key in self.user_ids_by_email:
+            return False
+        self.users[row["user_id"]] = row
+        self.user_ids_by_email[email_key] = row["user_id"]
+        return True
+
+    def get_by_email(self, user_email: str) -> Optional[dict]:
+        user_id = self.user_ids_by_email.get(user_email.lower())
+        if user_id is None:
+            return None
+        return self.users[user_id]
+
+    def update(self, user_id: uuid.UUID, values: dict) -> Optional[dict]:
+        """Update row and email index, returns None if new email belongs to other user."""
+        row = self.users[user_id]
+        old_email_key = row["user_email"].lower()
+        new_email_key = values.get("user_email", row["user_email"]).lower()
+        if new_email_key != old_email_key:
+            if new_email_key in self.user_ids_by_email:
+                return None
+            del self.user_ids_by_email[old_email_key]
+            self.user_ids_by_email[new_email_key] = user_id
+        row.update(values)
+        return row
+
+    def delete(self, user_id: uuid.UUID) -> Optional[dict]:
+        row = self.users.pop(user_id, None)
+        if row is not None:
+            del self.user_ids_by_email[row["user_email"].lower()]
+        return row
+
+    def clear(self) -> None:
+        self.users.clear()
+        self.user_ids_by_email.clear()
+
+
+# shared by all requests of worker process, data is lost on restart
+in_memory_users_storage = InMemoryUsersStorage()
+
+
+def _public_user(row: dict) -> dict:
+    return {field: row[field] for field in USER_FIELDS}
+
+
+def _filter_users(
+        storage: InMemoryUsersStorage,
+        country: Optional[str],
+        consent_to_mailing: Optional[bool]
+) -> List[dict]:
+    """Filtered users in order of users listing: by registration date, then by id."""
+    rows = [
+        row for row in storage.users.values()
+        if (country is None or row["country"] == country)
+        and (consent_to_mailing is None or row["consent_to_mailing"] == consent_to_mailing)
+    ]
+    rows.sort(key=lambda row: (row["date_registration"], row["user_id"]))
+    return rows
+
+
+SEARCH_FIELDS = ("name", "surname", "lastname", "country")
+# default pg_trgm.similarity_threshold of % operator
+SIMILARITY_THRESHOLD = 0.3
+WORD = re.compile(r"\w+")
+
+
+def _trigrams(value: str) -> FrozenSet[str]:
+    """Trigrams of value like pg_trgm makes them: per lowercased word padded with spaces."""
+    trigrams = set()
+    for word in WORD.findall(value.lower()):
+        padded = f"  {word} "
+        trigrams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(trigrams)
+
+
+def _similarity(first: FrozenSet[str], second: FrozenSet[str]) -> float:
+    if not first or not second:
+        return 0.0
+    shared = len(first & second)
+    return shared / (len(first) + len(second) - shared)
+
+
+def _search_score(row: dict, search_text: str, search_trigrams: FrozenSet[str]) -> Optional[float]:
+    """Score of user like in db search, None if user does not match."""
+    values = [row[field] or "" for field in SEARCH_FIELDS]
+    similarity = max(_similarity(_trigrams(value), search_trigrams) for value in values)
+    is_prefix = any(value.lower().startswith(search_text.lower()) for value in values)
+    if not is_prefix and similarity < SIMILARITY_THRESHOLD:
+        return None
+    return similarity + (1 if is_prefix else 0)
+
+
+class InMemoryUsersService(CrudService):
+    """CRUD for users kept in process memory, same responses and errors as UsersService.
+
+    Used to run api without postgres, e.g. to benchmark framework, serialization and
+    hashing overhead apart from the database.
+    """
+
+    def __init__(self, storage: InMemoryUsersStorage):
+        self.storage = storage
+
+    async def create_user(
+            self,
+            name: str,
+            lastname: Union[str, None],
+            surname: str,
+            country: str,
+            user_email: EmailStr,
+            user_password: str,
+            consent_to_mailing: bool = False
+    ) -> Union[UserIdResponse, HTTPException]:
+        """Func for create new user of store."""
+        try:
+            hashed_password = await Hasher.async_get_pass_hash(user_password)
+        except HashingPoolSaturated as ex:
+            logger.warning(f"Rejected create new user: {ex}")
+            return HTTPException(status_code=503, detail=str(ex))
+        new_user = dict(
+            user_id=uuid.uuid4(),
+            name=name,
+            lastname=lastname,
+            surname=surname,
+            country=country,
+            user_email=user_email,
+            date_registration=datetime.datetime.now(datetime.timezone.utc),
+            consent_to_mailing=consent_to_mailing,
+            hashed_password=hashed_password,
+            version=1
+        )
+        if not self.storage.insert(new_user):
+            error_message = f"Error while create new user: email {user_email} already exists"
+            logger.error(error_message)
+            return HTTPException(status_code=402, detail=error_message)
+        logger.info(f"Created new user with id {new_user['user_id']}.")
+        return UserIdResponse(user_id=new_user["user_id"])
+
+    async def bulk_create_users(
+            self,
+            users: AsyncIterator[Tuple[int, Union[CreateUserRequest, str]]]
+    ) -> BulkCreateUsersResponse:
+        """Create users from stream of (index, user or validation error) in chunks."""
+        results: List[BulkCreateUserResult] = []
+        chunk: List[Tuple[int, CreateUserRequest]] = []
+        async for index, user in users:
+            if isinstance(user, str):
+                results.append(BulkCreateUserResult(index=index, status="invalid", detail=user))
+                continue
+            chunk.append((index, user))
+            if len(chunk) >= settings.BULK_CREATE_CHUNK_SIZE:
+                results.extend(await self._create_users_chunk(chunk))
+                chunk = []
+        if chunk:
+            results.extend(await self._create_users_chunk(chunk))
+        results.sort(key=lambda item: item.index)
+        created = sum(1 for item in results if item.status == "created")
+        duplicates = sum(1 for item in results if item.status == "duplicate")
+        logger.info(f"Bulk created {created} users, skipped {duplicates} duplicates.")
+        return BulkCreateUsersResponse(
+            created=created,
+            duplicates=duplicates,
+            failed=len(results) - created - duplicates,
+            results=results
+        )
+
+    async def _create_users_chunk(
+            self,
+            chunk: List[Tuple[int, CreateUserRequest]]
+    ) -> List[BulkCreateUserResult]:
+        """Hash passwords of chunk in one batch and insert users skipping taken emails."""
+        try:
+            hashed_passwords = await Hasher.async_get_pass_hashes([user.user_pass for _, user in chunk])
+        except Exception as ex:
+            error_message = f"Error while bulk create users: {ex}"
+            logger.error(error_message)
+            return [
+                BulkCreateUserResult(index=index, user_email=user.user_email, status="error", detail=error_message)
+                for index, user in chunk
+            ]
+        registration_date = datetime.datetime.now(datetime.timezone.utc)
+        results: List[BulkCreateUserResult] = []
+        for (index, user), hashed_password in zip(chunk, hashed_passwords):
+            row = dict(
+                user_id=uuid.uuid4(),
+                name=user.name,
+                lastname=user.lastname,
+                surname=user.surname,
+                country=user.country,
+                user_email=user.user_email,
+                date_registration=registration_date,
+                consent_to_mailing=user.consent_to_mailing,
+                hashed_password=hashed_password,
+                version=1
+            )
+            if self.storage.insert(row):
+                results.append(BulkCreateUserResult(
+                    index=index, user_email=user.user_email, status="created", user_id=row["user_id"]
+                ))
+            else:
+                results.append(BulkCreateUserResult(index=index, user_email=user.user_email, status="duplicate"))
+        return results
+
+    async def get_user_by_id(
+            self,
+            user_id: uuid.UUID
+    ) -> Union[SelectUserResponse, HTTPException]:
+        """Get info about user by id."""
+        row = self.storage.users.get(user_id)
+        if row is None:
+            return HTTPException(status_code=400, detail="User not found")
+        return SelectUserResponse(**_public_user(row))
+
+    async def get_user_json_by_id(
+            self,
+            user_id: uuid.UUID,
+            min_version: int = 0
+    ) -> Union[Tuple[bytes, int], HTTPException]:
+        """Get user as serialized json with its version."""
+        row = self.storage.users.get(user_id)
+        if row is None:
+            return HTTPException(status_code=400, detail="User not found")
+        hot_path_logger.info(f"Success select user with id {user_id}")
+        return orjson.dumps(_public_user(row)), row["version"]
+
+    async def get_users_json_by_ids(self, user_ids: List[uuid.UUID]) -> Union[bytes, HTTPException]:
+        """Get users by ids as serialized SelectUsersBatchResponse."""
+        users = [self.storage.users.get(user_id) for user_id in user_ids]
+        return orjson.dumps({
+            "users": [_public_user(row) if row is not None else None for row in users],
+            "not_found": [user_id for user_id, row in zip(user_ids, users) if row is None],
+        })
+
+    async def list_users(
+            self,
+            limit: int,
+            cursor: Optional[str] = None,
+            country: Optional[str] = None,
+            consent_to_mailing: Optional[bool] = None
+    ) -> Union[UsersPageResponse, HTTPException]:
+        """Get page of users after cursor, ordered by registration date."""
+        rows = _filter_users(self.storage, country=country, consent_to_mailing=consent_to_mailing)
+        if cursor is not None:
+            try:
+                date_registration, user_id = decode_cursor(cursor, (str, str))
+                cursor_key = (cursor_datetime(date_registration), cursor_uuid(user_id))
+            except InvalidCursor as ex:
+                return HTTPException(status_code=422, detail=str(ex))
+            rows = [row for row in rows if (row["date_registration"], row["user_id"]) > cursor_key]
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor([rows[-1]["date_registration"].isoformat(), str(rows[-1]["user_id"])])
+        return UsersPageResponse(
+            users=[SelectUserResponse(**_public_user(row)) for row in rows],
+            next_cursor=next_cursor
+        )
+
+    async def search_users(
+            self,
+            search_text: str,
+            limit: int,
+            cursor: Optional[str] = None
+    ) -> Union[UsersPageResponse, HTTPException]:
+        """Search users by prefix or similarity of name, surname, lastname or country, ranked by score."""
+        search_trigrams = _trigrams(search_text)
+        scored_rows = []
+        for row in self.storage.users.values():
+            score = _search_score(row, search_text, search_trigrams)
+            if score is not None:
+                scored_rows.append((score, row))
+        scored_rows.sort(key=lambda item: (-item[0], item[1]["user_id"]))
+        if cursor is not None:
+            try:
+                cursor_score, user_id, cursor_text = decode_cursor(cursor, ((int, float), str, str))
+                cursor_key = (-float(cursor_score), cursor_uuid(user_id))
+            except InvalidCursor as ex:
+                return HTTPException(status_code=422, detail=str(ex))
+            if cursor_text != search_text:
+                return HTTPException(status_code=422, detail="Invalid cursor: it was made for other query.")
+            scored_rows = [item for item in scored_rows if (-item[0], item[1]["user_id"]) > cursor_key]
+
+        next_cursor = None
+        if len(scored_rows) > limit:
+            scored_rows = scored_rows[:limit]
+            last_score, last_row = scored_rows[-1]
+            next_cursor = encode_cursor([last_score, str(last_row["user_id"]), search_text])
+        return UsersPageResponse(
+            users=[SelectUserResponse(**_public_user(row)) for _, row in scored_rows],
+            next_cursor=next_cursor
+        )
+
+    async def stream_users(
+            self,
+            country: Optional[str] = None,
+            consent_to_mailing: Optional[bool] = None
+    ) -> AsyncIterator[List[dict]]:
+        """Stream batches of users of snapshot taken on first batch."""
+        rows = _filter_users(self.storage, country=country, consent_to_mailing=consent_to_mailing)
+        for start in range(0, len(rows), settings.USERS_EXPORT_BATCH_SIZE):
+            yield [_public_user(row) for row in rows[start:start + settings.USERS_EXPORT_BATCH_SIZE]]
+
+    async def is_email_available(self, user_email: str) -> Union[EmailAvailabilityResponse, HTTPException]:
+        """Check that email is not registered."""
+        return EmailAvailabilityResponse(
+            user_email=user_email,
+            available=self.storage.get_by_email(user_email) is None
+        )
+
+    async def get_user_version(self, user_id: uuid.UUID, min_version: int = 0) -> Union[int, None, HTTPException]:
+        """Get current version of user."""
+        row = self.storage.users.get(user_id)
+        if row is None:
+            return None
+        return row["version"]
+
+    async def update_user_by_id(
+            self,
+            user_id,
+            expected_versions: Optional[List[int]] = None,
+            **kwargs
+    ) -> Union[UserVersionResponse, HTTPException]:
+        """Update user info by id.
+
+        If expected_versions is set, user is updated only if its version is one of them,
+        otherwise 412 is returned.
+        """
+        row = self.storage.users.get(user_id)
+        if row is None:
+            return HTTPException(status_code=404, detail=f"User with id {user_id} not found.")
+        if expected_versions is not None and row["version"] not in expected_versions:
+            return HTTPException(
+                status_code=412,
+                detail=f"User with id {user_id} was changed, current version is {row['version']}."
+            )
+        updated_user = self.storage.update(user_id, dict(kwargs, version=row["version"] + 1))
+        if updated_user is None:
+            error_message = f"Error while update user by id = {user_id}: email {kwargs['user_email']} already exists"
+            logger.error(error_message)
+            return HTTPException(status_code=402, detail=error_message)
+        logger.info(f"Success update user data by id {user_id}")
+        return UserVersionResponse(user_id=user_id, version=updated_user["version"])
+
+    async def delete_user_by_id(self, user_id) -> Union[UserIdResponse, HTTPException]:
+        """Delete data about user by id."""
+        if self.storage.delete(user_id) is None:
+            return HTTPException(status_code=404, detail=f"User with id {user_id} not found.")
+        logger.info(f"Success deleted user's info by id {user_id}")
+        return UserIdResponse(user_id=user_id)
+
+    async def get_user_credentials(self, user_email: str) -> Optional[SelectUserByEmailResponse]:
+        """Get user id, email and password hash by email, used for login."""
+        row = self.storage.get_by_email(user_email)
+        if row is None:
+            return None
+        return SelectUserByEmailResponse(**row)
+
+    async def set_password_hash(self, user_id: uuid.UUID, old_hashed_password: str, new_hashed_password: str) -> None:
+        """Replace password hash if it was not changed since it was read."""
+        row = self.storage.users.get(user_id)
+        if row is not None and row["hashed_password"] == old_hashed_password:
+            row["hashed_password"] = new_hashed_password
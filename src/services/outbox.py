@@ -0,0 +1,109 @@
+import asyncio
+import uuid
+from typing import Dict, List, Union
+
+import orjson
+from loguru import logger
+from sqlalchemy import delete, select
+
+from src.core.config import settings
+from src.db import pg_session
+from src.pkg.event_bus import publisher
+from src.pkg.storage import models
+
+USER_CREATED = "user_created"
+USER_UPDATED = "user_updated"
+USER_DELETED = "user_deleted"
+
+# columns of user that are sent in events, password hash never leaves db
+USER_EVENT_FIELDS = (
+    "name",
+    "lastname",
+    "surname",
+    "country",
+    "user_email",
+    "date_registration",
+    "consent_to_mailing",
+    "version",
+)
+
+
+def user_event(event_type: str, user_id: uuid.UUID, payload: dict) -> models.OutboxEvents:
+    """Outbox row of user event, it is added to session of change and committed with it."""
+    return models.OutboxEvents(
+        event_type=event_type,
+        aggregate_id=user_id,
+        payload=payload
+    )
+
+
+def user_event_payload(user: dict) -> dict:
+    return {field: user[field] for field in USER_EVENT_FIELDS if field in user}
+
+
+def _event_message(event: models.OutboxEvents) -> Dict[str, Union[str, bytes]]:
+    return {
+        "event_id": str(event.event_id),
+        "event_type": event.event_type,
+        "aggregate_id": str(event.aggregate_id),
+        "payload": orjson.dumps(event.payload),
+        "created_at": event.created_at.isoformat(),
+    }
+
+
+class OutboxPublisher:
+    """Background task that moves events from outbox table to event bus.
+
+    Batch is locked with FOR UPDATE SKIP LOCKED, published and deleted in one
+    transaction, so publishers of several workers take different batches.
+    Delivery is at least once: if transaction fails after publish, batch is
+    published again, consumers deduplicate events by event_id. Order is kept
+    within a batch only, consumers of one user compare payload version.
+    """
+
+    def __init__(self):
+        self._task: Union[asyncio.Task, None] = None
+
+    async def publish_batch(self) -> int:
+        """Publish one batch of oldest events, returns count of published events."""
+        async with pg_session.SessionLocal() as db_session:
+            async with db_session.begin():
+                query = (
+                    select(models.OutboxEvents)
+                    .order_by(models.OutboxEvents.event_id)
+                    .limit(settings.OUTBOX_BATCH_SIZE)
+                    .with_for_update(skip_locked=True)
+                )
+                result = await db_session.execute(query)
+                events: List[models.OutboxEvents] = result.scalars().all()
+                if not events:
+                    return 0
+                await publisher.event_publisher.publish_many([_event_message(event) for event in events])
+                await db_session.execute(
+                    delete(models.OutboxEvents)
+                    .where(models.OutboxEvents.event_id.in_([event.event_id for event in events]))
+                    .execution_options(synchronize_session=False)
+                )
+        return len(events)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                published = await self.publish_batch()
+            except Exception as ex:
+                logger.error(f"Error while publish outbox events, retry in {settings.OUTBOX_RETRY_SECONDS}s: {ex}")
+                await asyncio.sleep(settings.OUTBOX_RETRY_SECONDS)
+                continue
+            # full batch means more events are waiting, next batch is taken at once
+            if published < settings.OUTBOX_BATCH_SIZE:
+                await asyncio.sleep(settings.OUTBOX_POLL_SECONDS)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+
+
+outbox_publisher = OutboxPublisher()
@@ -0,0 +1,111 @@
+import uuid
+from datetime import timedelta
+from typing import Optional, Union
+
+from fastapi import Depends, HTTPException
+from jose import JWTError
+from loguru import logger
+from starlette import status
+
+from src.api.v1.users.resp_models import Token
+from src.core.config import settings
+from src.pkg.cache_storage.storage import (CacheStorage, CacheStorageError,
+                                           get_cache_storage)
+from src.security.tokens import UserTokens
+from src.services.memory_users import InMemoryUsersService
+from src.services.users import UsersService, get_users_service
+
+
+class RefreshTokens:
+    """Issue, rotate and revoke refresh tokens.
+
+    Every refresh token can be used once: it is removed from store on renewal
+    and replaced with a new one of the same family, so renewal costs signature
+    check and store lookups instead of password verification. Token presented
+    again after renewal means it was stolen, then the whole family started by
+    login is revoked. New tokens get current email of user, tokens of deleted
+    user are not renewed, user is usually served by cache.
+    """
+
+    def __init__(self, store: CacheStorage, users_service: Union[UsersService, InMemoryUsersService]):
+        self.store = store
+        self.users_service = users_service
+
+    @staticmethod
+    def _token_key(token_id: str) -> str:
+        return f"refresh_tokens:{token_id}"
+
+    @staticmethod
+    def _family_key(family: str) -> str:
+        return f"refresh_token_families:{family}"
+
+    async def issue_tokens(
+            self,
+            user_id: uuid.UUID,
+            user_email: str,
+            family: Optional[str] = None
+    ) -> Union[Token, HTTPException]:
+        """Create access token and refresh token saved in revocation store, login starts new family."""
+        data = {"sub": user_email, "user_id": str(user_id)}
+        access_token = UserTokens.create_access_token(
+            data=data,
+            expires_delta=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+        )
+        family = family or uuid.uuid4().hex
+        token_id = uuid.uuid4().hex
+        refresh_token = UserTokens.create_refresh_token(data=dict(data, family=family), token_id=token_id)
+        try:
+            # refresh token missing in store could not be renewed, so it is not returned
+            await self.store.set_many(
+                {self._token_key(token_id): family.encode(), self._family_key(family): str(user_id).encode()},
+                expire=int(timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS).total_seconds()),
+                raise_errors=True
+            )
+        except CacheStorageError as ex:
+            logger.error(f"Error while save refresh token of user {user_id}: {ex}")
+            return HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Tokens can not be issued now.")
+        return Token(access_token=access_token, token_type="bearer", refresh_token=refresh_token)
+
+    async def refresh(self, refresh_token: str) -> Union[Token, HTTPException]:
+        """Exchange active refresh token for new pair of tokens."""
+        try:
+            payload = UserTokens.decode_refresh_token(refresh_token)
+        except JWTError as ex:
+            return HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=f"Invalid refresh token: {ex}")
+        family = payload.get("family")
+        if await self.store.pop(self._token_key(payload["jti"])) is None:
+            if family is not None and await self.store.pop(self._family_key(family)) is not None:
+                logger.warning(f"Reused refresh token of user {payload.get('user_id')}, family {family} is revoked")
+            else:
+                logger.warning(f"Used revoked refresh token of user {payload.get('user_id')}")
+            return HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Refresh token was revoked.")
+        if family is not None and await self.store.get(self._family_key(family)) is None:
+            logger.warning(f"Used refresh token of revoked family {family}")
+            return HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Refresh token was revoked.")
+        user_id = uuid.UUID(payload["user_id"])
+        user = await self.users_service.get_user_by_id(user_id=user_id)
+        if type(user) == HTTPException:
+            if user.status_code != status.HTTP_400_BAD_REQUEST:
+                return user
+            logger.warning(f"Used refresh token of deleted user {user_id}")
+            return HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User of refresh token was deleted.")
+        return await self.issue_tokens(user_id=user_id, user_email=user.user_email, family=family)
+
+    async def revoke(self, refresh_token: str) -> Union[None, HTTPException]:
+        """Remove refresh token and its family from store, tokens of the session can not be used anymore."""
+        try:
+            payload = UserTokens.decode_refresh_token(refresh_token)
+        except JWTError as ex:
+            return HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=f"Invalid refresh token: {ex}")
+        keys = [self._token_key(payload["jti"])]
+        if payload.get("family") is not None:
+            keys.append(self._family_key(payload["family"]))
+        await self.store.delete(*keys)
+        return None
+
+
+def get_refresh_tokens_service(
+        store: CacheStorage = Depends(get_cache_storage),
+        users_service: Union[UsersService, InMemoryUsersService] = Depends(get_users_service)
+) -> RefreshTokens:
+    return RefreshTokens(store=store, users_service=users_service)
@@ -1,26 +1,240 @@
 import datetime
 import uuid
-from functools import lru_cache
-from typing import Union
+from functools import partial
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Tuple, Union
 
+import orjson
 from fastapi import Depends, HTTPException
 from pydantic import EmailStr
-from sqlalchemy import select, update
+from sqlalchemy import (Float, and_, any_, case, cast, delete, func, literal,
+                        or_, select, text, tuple_, update)
+from sqlalchemy.dialects.postgresql import ARRAY, UUID, insert
+from sqlalchemy.engine import RowMapping
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from loguru import logger
 
-from src.api.v1.users.resp_models import UserIdResponse, SelectUserResponse
-from src.db.pg_session import get_db
+from src.api.v1.users.resp_models import (BulkCreateUserResult,
+                                          BulkCreateUsersResponse,
+                                          CreateUserRequest,
+                                          EmailAvailabilityResponse,
+                                          SelectUserResponse, UserIdResponse,
+                                          UserVersionResponse,
+                                          UsersPageResponse)
+from src.core.config import settings
+from src.core.logger import hot_path_logger
+from src.db import pg_session, replicas
+from src.db.pg_session import USE_REPLICA, db_error_response, get_db
+from src.pkg.cache_storage.storage import CacheStorage, get_cache_storage
+from src.pkg.coalescing.batch_loader import BatchLoader
+from src.pkg.coalescing.single_flight import SingleFlight
+from src.pkg.pagination.cursor import (InvalidCursor, cursor_datetime,
+                                      cursor_uuid, decode_cursor,
+                                      encode_cursor)
 from src.pkg.storage import models
 from src.services.abstract.abstract_services import CrudService
-from src.pkg.hashing.hashing import Hasher
+from src.pkg.hashing.hashing import Hasher, HashingPoolSaturated
+from src.services.known_emails import known_emails
+from src.services.memory_users import InMemoryUsersService, in_memory_users_storage
+from src.services.outbox import (USER_CREATED, USER_DELETED, USER_UPDATED,
+                                 user_event, user_event_payload)
+
+
+# concurrent lookups of the same user share one query
+_users_flight = SingleFlight()
+
+USER_COLUMNS = (
+    models.Users.user_id,
+    models.Users.name,
+    models.Users.lastname,
+    models.Users.surname,
+    models.Users.country,
+    models.Users.user_email,
+    models.Users.date_registration,
+    models.Users.consent_to_mailing,
+    models.Users.version,
+)
+
+
+def _filter_users_query(country: Optional[str], consent_to_mailing: Optional[bool]):
+    """Select public user columns ordered by (date_registration, user_id) keyset."""
+    query = select(*USER_COLUMNS)
+    if country is not None:
+        query = query.where(models.Users.country == country)
+    if consent_to_mailing is not None:
+        query = query.where(models.Users.consent_to_mailing == consent_to_mailing)
+    return query.order_by(models.Users.date_registration, models.Users.user_id)
+
+
+def _users_page_query(
+        cursor_key: Optional[Tuple[datetime.datetime, uuid.UUID]],
+        country: Optional[str],
+        consent_to_mailing: Optional[bool]
+):
+    """Select users after (date_registration, user_id) keyset of previous page."""
+    query = _filter_users_query(country=country, consent_to_mailing=consent_to_mailing)
+    if cursor_key is not None:
+        query = query.where(
+            tuple_(models.Users.date_registration, models.Users.user_id) > tuple_(*cursor_key)
+        )
+    return query
+
+
+SEARCH_COLUMNS = (models.Users.name, models.Users.surname, models.Users.lastname, models.Users.country)
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _search_users_query(search_text: str, use_trigrams: bool = True):
+    """Select users similar to search_text or having field starting with it, best matches first.
+
+    Both conditions are served by trigram indexes, score is trigram similarity of best
+    matching field plus 1 for prefix match, so prefix matches go first. Without pg_trgm
+    only prefix matches are selected, all of them with score 1.
+    """
+    prefix_pattern = f"{_escape_like(search_text)}%"
+    prefix_matches = [column.ilike(prefix_pattern, escape="\\") for column in SEARCH_COLUMNS]
+    if use_trigrams:
+        score = cast(
+            func.greatest(*(func.similarity(func.coalesce(column, ""), search_text) for column in SEARCH_COLUMNS))
+            + case((or_(*prefix_matches), 1), else_=0),
+            Float
+        )
+        condition = or_(*(column.op("%")(search_text) for column in SEARCH_COLUMNS), *prefix_matches)
+    else:
+        score = cast(literal(1), Float)
+        condition = or_(*prefix_matches)
+    query = (
+        select(*USER_COLUMNS, score.label("score"))
+        .where(condition)
+        .order_by(score.desc(), models.Users.user_id)
+        .execution_options(**{USE_REPLICA: True})
+    )
+    return query, score
+
+
+# migration skips trigram indexes when pg_trgm is not available, search checks it once per process
+_has_trigrams: Optional[bool] = None
+
+
+async def _trigrams_installed(db_session: AsyncSession) -> bool:
+    global _has_trigrams
+    if _has_trigrams is None:
+        result = await db_session.execute(
+            text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'").execution_options(**{USE_REPLICA: True})
+        )
+        _has_trigrams = result.first() is not None
+        if not _has_trigrams:
+            logger.warning("Extension pg_trgm is not installed, users search matches only prefixes.")
+    return _has_trigrams
+
+
+async def _fetch_users_by_ids(user_ids: List[uuid.UUID], use_replica: bool = False) -> Dict[uuid.UUID, dict]:
+    """Select public columns of users with one WHERE user_id = ANY(:ids) query.
+
+    Rows are returned as plain dicts ready for orjson, without ORM entities and
+    response models. Used by batch loaders and batch endpoint, runs in own session
+    because batch is shared by lookups of different requests.
+    """
+    async with pg_session.SessionLocal() as db_session:
+        query = (
+            select(*USER_COLUMNS)
+            .where(models.Users.user_id == any_(literal(user_ids, ARRAY(UUID(as_uuid=True)))))
+            .execution_options(**{USE_REPLICA: use_replica})
+        )
+        result = await db_session.execute(query)
+        return {row["user_id"]: dict(row) for row in result.mappings()}
+
+
+async def _fetch_fresh_users_by_ids(
+        min_versions: Dict[uuid.UUID, int]
+) -> Dict[uuid.UUID, dict]:
+    """Select users from replica, users missing there or older than min version are selected from primary.
+
+    Min version comes from tombstone of the last update or from client, so replica
+    lag never hides write that client already saw. Rows older than tombstone are
+    kept out of cache by set_many_if_newer anyway.
+    """
+    users = await _fetch_users_by_ids(list(min_versions), use_replica=True)
+    if replicas.replica_set is None:
+        return users
+    lagging_ids = [
+        user_id for user_id, min_version in min_versions.items()
+        if user_id not in users or users[user_id]["version"] < min_version
+    ]
+    if lagging_ids:
+        users.update(await _fetch_users_by_ids(lagging_ids))
+    return users
+
+
+# lookups of different users made in the same event loop tick share one query
+_replica_users_loader = BatchLoader(
+    load_many=partial(_fetch_users_by_ids, use_replica=True),
+    max_batch_size=settings.USERS_BATCH_MAX_SIZE
+)
+_users_loader = BatchLoader(load_many=_fetch_users_by_ids, max_batch_size=settings.USERS_BATCH_MAX_SIZE)
+
+
+def _pack_user(user: dict) -> bytes:
+    """Cached value of user: version and serialized user, version is read without parsing json."""
+    return b"%d:" % user["version"] + orjson.dumps(user, default=str)
+
+
+def _tombstone(version: int) -> bytes:
+    """Cached value that keeps payloads older than version out of cache, it is read as a miss.
+
+    Written on update and delete instead of removing key, so lookup that read the row
+    before the change can not put its stale payload back after the change.
+    """
+    return b"%d:" % version
+
+
+def _cached_version(cached_user: Optional[bytes]) -> int:
+    """Version of cached user or tombstone, 0 for missing value."""
+    if cached_user is None:
+        return 0
+    return int(cached_user.partition(b":")[0])
+
+
+def _unpack_user(cached_user: Optional[bytes]) -> Optional[Tuple[bytes, int]]:
+    """Payload and version of cached user, None for missing value and tombstone."""
+    if cached_user is None:
+        return None
+    version, _, payload = cached_user.partition(b":")
+    if not payload:
+        return None
+    return payload, int(version)
+
+
+def _bulk_user_row(user: CreateUserRequest, hashed_password: str, registration_date: datetime.datetime) -> dict:
+    """Values of user in multi-row INSERT, there are BULK_CREATE_ROW_PARAMETERS of them."""
+    return dict(
+        user_id=uuid.uuid4(),
+        name=user.name,
+        lastname=user.lastname,
+        surname=user.surname,
+        country=user.country,
+        user_email=user.user_email,
+        date_registration=registration_date,
+        consent_to_mailing=user.consent_to_mailing,
+        hashed_password=hashed_password,
+        version=1
+    )
 
 
 class UsersService(CrudService):
     """Class that realise CRUD for users table"""
 
-    def __init__(self, db: AsyncSession):
+    def __init__(self, db: AsyncSession, cache: CacheStorage):
         self.db_session = db
+        self.cache = cache
+
+    @staticmethod
+    def _user_cache_key(user_id: uuid.UUID) -> str:
+        # bump prefix when format of cached payload changes
+        return f"users:v3:{user_id}"
 
     async def create_user(
             self,
@@ -34,7 +248,8 @@ class UsersService(CrudService):
     ) -> Union[UserIdResponse, HTTPException]:
         """Func for create new user of store."""
         try:
-            new_user = models.Users(
+            user_values = dict(
+                user_id=uuid.uuid4(),
                 name=name,
                 lastname=lastname,
                 surname=surname,
@@ -42,97 +257,403 @@ class UsersService(CrudService):
                 user_email=user_email,
                 date_registration=datetime.datetime.now(),
                 consent_to_mailing=consent_to_mailing,
-                hashed_password=Hasher.get_pass_hash(user_password)
+                hashed_password=await Hasher.async_get_pass_hash(user_password),
+                version=1
             )
+            new_user = models.Users(**user_values)
             self.db_session.add(new_user)
+            if settings.OUTBOX_ENABLED:
+                self.db_session.add(user_event(USER_CREATED, new_user.user_id, user_event_payload(user_values)))
             await self.db_session.commit()
+            known_emails.add(user_email)
             await self.db_session.refresh(new_user)
             logger.info(f"Created new user with id {new_user.user_id}.")
             return UserIdResponse(
                 user_id=new_user.user_id
             )
 
+        except HashingPoolSaturated as ex:
+            logger.warning(f"Rejected create new user: {ex}")
+            return HTTPException(status_code=503, detail=str(ex))
+        except IntegrityError as ex:
+            return db_error_response(ex, f"Error while create new user: email {user_email} already exists")
         except Exception as ex:
-            error_message = f"Error while create new user: {ex}"
-            logger.error(error_message)
-            return HTTPException(status_code=402, detail=error_message)
+            return db_error_response(ex, "Error while create new user")
+
+    async def bulk_create_users(
+            self,
+            users: AsyncIterator[Tuple[int, Union[CreateUserRequest, str]]]
+    ) -> BulkCreateUsersResponse:
+        """Create users from stream of (index, user or validation error) in chunked transactions."""
+        results: List[BulkCreateUserResult] = []
+        chunk: List[Tuple[int, CreateUserRequest]] = []
+        async for index, user in users:
+            if isinstance(user, str):
+                results.append(BulkCreateUserResult(index=index, status="invalid", detail=user))
+                continue
+            chunk.append((index, user))
+            if len(chunk) >= settings.BULK_CREATE_CHUNK_SIZE:
+                results.extend(await self._create_users_chunk(chunk))
+                chunk = []
+        if chunk:
+            results.extend(await self._create_users_chunk(chunk))
+        results.sort(key=lambda item: item.index)
+        created = sum(1 for item in results if item.status == "created")
+        duplicates = sum(1 for item in results if item.status == "duplicate")
+        logger.info(f"Bulk created {created} users, skipped {duplicates} duplicates.")
+        return BulkCreateUsersResponse(
+            created=created,
+            duplicates=duplicates,
+            failed=len(results) - created - duplicates,
+            results=results
+        )
+
+    async def _create_users_chunk(
+            self,
+            chunk: List[Tuple[int, CreateUserRequest]]
+    ) -> List[BulkCreateUserResult]:
+        """Insert chunk of users with one multi-row INSERT ... ON CONFLICT DO NOTHING."""
+        results: List[BulkCreateUserResult] = []
+        unique_users: List[Tuple[int, CreateUserRequest]] = []
+        chunk_emails = set()
+        for index, user in chunk:
+            email_key = user.user_email.lower()
+            if email_key in chunk_emails:
+                results.append(BulkCreateUserResult(index=index, user_email=user.user_email, status="duplicate"))
+                continue
+            chunk_emails.add(email_key)
+            unique_users.append((index, user))
+        if not unique_users:
+            return results
+
+        try:
+            hashed_passwords = await Hasher.async_get_pass_hashes([user.user_pass for _, user in unique_users])
+            registration_date = datetime.datetime.now()
+            rows = [
+                _bulk_user_row(user, hashed_password, registration_date)
+                for (_, user), hashed_password in zip(unique_users, hashed_passwords)
+            ]
+            query = insert(models.Users).values(rows).on_conflict_do_nothing().returning(models.Users.user_id)
+            result = await self.db_session.execute(query)
+            created_ids = set(result.scalars().all())
+            if settings.OUTBOX_ENABLED:
+                self.db_session.add_all([
+                    user_event(USER_CREATED, row["user_id"], user_event_payload(row))
+                    for row in rows if row["user_id"] in created_ids
+                ])
+            await self.db_session.commit()
+        except Exception as ex:
+            await self.db_session.rollback()
+            error = db_error_response(ex, "Error while bulk create users")
+            results.extend(
+                BulkCreateUserResult(index=index, user_email=user.user_email, status="error", detail=error.detail)
+                for index, user in unique_users
+            )
+            return results
+
+        for (index, user), row in zip(unique_users, rows):
+            if row["user_id"] in created_ids:
+                known_emails.add(user.user_email)
+                results.append(BulkCreateUserResult(
+                    index=index, user_email=user.user_email, status="created", user_id=row["user_id"]
+                ))
+            else:
+                results.append(BulkCreateUserResult(index=index, user_email=user.user_email, status="duplicate"))
+        return results
 
     async def get_user_by_id(
             self,
             user_id: uuid.UUID
     ) -> Union[SelectUserResponse, HTTPException]:
         """Get info about user by id."""
+        result = await self.get_user_json_by_id(user_id=user_id)
+        if type(result) == HTTPException:
+            return result
+        payload, _ = result
+        return SelectUserResponse.parse_raw(payload)
+
+    async def get_user_json_by_id(
+            self,
+            user_id: uuid.UUID,
+            min_version: int = 0
+    ) -> Union[Tuple[bytes, int], HTTPException]:
+        """Get user as serialized json with its version, cached payload is returned as is without db query.
+
+        Cache miss is read from replica, min_version is the version client already saw,
+        older replica row is not returned.
+        """
+        cached_user = await self.cache.get(self._user_cache_key(user_id))
+        unpacked_user = _unpack_user(cached_user)
+        if unpacked_user is not None and unpacked_user[1] >= min_version:
+            return unpacked_user
+        min_version = max(min_version, _cached_version(cached_user))
         try:
-            query = select(models.Users).where(models.Users.user_id == user_id)
-            result = await self.db_session.execute(query)
-            selected_user = result.scalars().first()
-            if not selected_user:
-                return HTTPException(status_code=400, detail="User not found")
-            logger.info(f"Success select user with id {selected_user.user_id}")
-            return SelectUserResponse(
-                user_id=selected_user.user_id,
-                name=selected_user.name,
-                lastname=selected_user.lastname,
-                surname=selected_user.surname,
-                country=selected_user.country,
-                user_email=selected_user.user_email,
-                date_registration=selected_user.date_registration,
-                consent_to_mailing=selected_user.consent_to_mailing
+            cached_user = await _users_flight.do(
+                (user_id, min_version), lambda: self._load_user(user_id, min_version)
             )
+        except Exception as ex:
+            return db_error_response(ex, f"Error while select user by id = {user_id}")
+        if cached_user is None:
+            return HTTPException(status_code=400, detail="User not found")
+        hot_path_logger.info(f"Success select user with id {user_id}")
+        return _unpack_user(cached_user)
+
+    async def _load_user(self, user_id: uuid.UUID, min_version: int) -> Optional[bytes]:
+        """Load user with batch of lookups made in the same tick, serialize it once and put to cache.
+
+        User missing on replica or older than min_version is loaded from primary,
+        replica may not have replayed the last write yet.
+        """
+        user = await _replica_users_loader.load(user_id)
+        if replicas.replica_set is not None and (user is None or user["version"] < min_version):
+            user = await _users_loader.load(user_id)
+        if user is None:
+            return None
+        cached_user = _pack_user(user)
+        await self.cache.set_many_if_newer(
+            {self._user_cache_key(user_id): cached_user},
+            expire=settings.USER_CACHE_EXPIRE_SECONDS
+        )
+        return cached_user
+
+    async def get_users_json_by_ids(self, user_ids: List[uuid.UUID]) -> Union[bytes, HTTPException]:
+        """Get users by ids as serialized SelectUsersBatchResponse.
+
+        Cache is read with one round trip and misses are selected from replica with one query,
+        cached payloads are joined into response without parsing.
+        """
+        cache_keys = [self._user_cache_key(user_id) for user_id in user_ids]
+        cached_values = dict(zip(user_ids, await self.cache.get_many(cache_keys)))
+        payloads: Dict[uuid.UUID, bytes] = {
+            user_id: unpacked_user[0]
+            for user_id, unpacked_user in zip(cached_values, map(_unpack_user, cached_values.values()))
+            if unpacked_user is not None
+        }
+        # tombstone versions of missed users, replica rows older than them are selected again from primary
+        missed_ids = {
+            user_id: _cached_version(cached_value)
+            for user_id, cached_value in cached_values.items() if user_id not in payloads
+        }
+        if missed_ids:
+            try:
+                selected_users = await _fetch_fresh_users_by_ids(missed_ids)
+            except Exception as ex:
+                return db_error_response(ex, "Error while select users by ids")
+            cached_users = {user_id: _pack_user(user) for user_id, user in selected_users.items()}
+            await self.cache.set_many_if_newer(
+                {self._user_cache_key(user_id): cached_user for user_id, cached_user in cached_users.items()},
+                expire=settings.USER_CACHE_EXPIRE_SECONDS
+            )
+            payloads.update((user_id, _unpack_user(cached_user)[0]) for user_id, cached_user in cached_users.items())
+        not_found = [user_id for user_id in user_ids if user_id not in payloads]
+        return b"".join((
+            b'{"users":[',
+            b",".join(payloads.get(user_id, b"null") for user_id in user_ids),
+            b'],"not_found":',
+            orjson.dumps(not_found),
+            b"}",
+        ))
+
+    async def list_users(
+            self,
+            limit: int,
+            cursor: Optional[str] = None,
+            country: Optional[str] = None,
+            consent_to_mailing: Optional[bool] = None
+    ) -> Union[UsersPageResponse, HTTPException]:
+        """Get page of users after cursor, ordered by registration date."""
+        cursor_key = None
+        if cursor is not None:
+            try:
+                date_registration, user_id = decode_cursor(cursor, (str, str))
+                cursor_key = (cursor_datetime(date_registration), cursor_uuid(user_id))
+            except InvalidCursor as ex:
+                return HTTPException(status_code=422, detail=str(ex))
+        query = _users_page_query(cursor_key=cursor_key, country=country, consent_to_mailing=consent_to_mailing)
+        try:
+            result = await self.db_session.execute(query.limit(limit + 1))
+            rows: Sequence[RowMapping] = result.mappings().all()
+        except Exception as ex:
+            return db_error_response(ex, "Error while select users page")
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor([rows[-1]["date_registration"].isoformat(), str(rows[-1]["user_id"])])
+        return UsersPageResponse(
+            users=[SelectUserResponse(**row) for row in rows],
+            next_cursor=next_cursor
+        )
+
+    async def search_users(
+            self,
+            search_text: str,
+            limit: int,
+            cursor: Optional[str] = None
+    ) -> Union[UsersPageResponse, HTTPException]:
+        """Search users by prefix or similarity of name, surname, lastname or country, ranked by score."""
+        try:
+            use_trigrams = await _trigrams_installed(self.db_session)
+        except Exception as ex:
+            return db_error_response(ex, "Error while check pg_trgm extension")
+        query, score = _search_users_query(search_text, use_trigrams=use_trigrams)
+        if cursor is not None:
+            try:
+                cursor_score, user_id, cursor_text = decode_cursor(cursor, ((int, float), str, str))
+                cursor_key = (float(cursor_score), cursor_uuid(user_id))
+            except InvalidCursor as ex:
+                return HTTPException(status_code=422, detail=str(ex))
+            if cursor_text != search_text:
+                return HTTPException(status_code=422, detail="Invalid cursor: it was made for other query.")
+            query = query.where(or_(
+                score < cursor_key[0],
+                and_(score == cursor_key[0], models.Users.user_id > cursor_key[1])
+            ))
+        try:
+            result = await self.db_session.execute(query.limit(limit + 1))
+            rows: Sequence[RowMapping] = result.mappings().all()
+        except Exception as ex:
+            return db_error_response(ex, f"Error while search users by {search_text!r}")
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor([rows[-1]["score"], str(rows[-1]["user_id"]), search_text])
+        return UsersPageResponse(
+            users=[SelectUserResponse(**row) for row in rows],
+            next_cursor=next_cursor
+        )
 
+    async def stream_users(
+            self,
+            country: Optional[str] = None,
+            consent_to_mailing: Optional[bool] = None
+    ) -> AsyncIterator[Sequence[RowMapping]]:
+        """Stream batches of users from server-side cursor, memory does not depend on table size."""
+        query = _filter_users_query(country=country, consent_to_mailing=consent_to_mailing)
+        result = await self.db_session.stream(query)
+        async for rows in result.mappings().partitions(settings.USERS_EXPORT_BATCH_SIZE):
+            yield rows
+
+    async def is_email_available(self, user_email: str) -> Union[EmailAvailabilityResponse, HTTPException]:
+        """Check that email is not registered, unknown emails are answered by filter without db query."""
+        if not known_emails.might_exist(user_email):
+            return EmailAvailabilityResponse(user_email=user_email, available=True)
+        try:
+            query = (
+                select(models.Users.user_id)
+                .where(func.lower(models.Users.user_email) == user_email.lower())
+                .execution_options(**{USE_REPLICA: True})
+            )
+            result = await self.db_session.execute(query)
+            return EmailAvailabilityResponse(user_email=user_email, available=result.first() is None)
         except Exception as ex:
-            error_message = f"Error while select user by id = {user_id}: {ex}"
-            logger.error(error_message)
-            return HTTPException(status_code=402, detail=error_message)
-        finally:
-            await self.db_session.close()
-
-    async def update_user_by_id(self, user_id, **kwargs) -> Union[UserIdResponse, HTTPException]:
-        """Update user info by id."""
+            return db_error_response(ex, f"Error while check email {user_email}")
+
+    async def get_user_version(
+            self,
+            user_id: uuid.UUID,
+            min_version: int = 0
+    ) -> Union[int, None, HTTPException]:
+        """Get current version of user from cache or by loading user to cache.
+
+        Request session is not used, so read request never holds two pooled connections
+        while loader selects the user in its own session.
+        """
+        result = await self.get_user_json_by_id(user_id=user_id, min_version=min_version)
+        if type(result) == HTTPException:
+            return None if result.status_code == 400 else result
+        return result[1]
+
+    async def update_user_by_id(
+            self,
+            user_id,
+            expected_versions: Optional[List[int]] = None,
+            **kwargs
+    ) -> Union[UserVersionResponse, HTTPException]:
+        """Update user info by id with single UPDATE ... RETURNING statement.
+
+        If expected_versions is set, user is updated only if its version is one of them,
+        otherwise 412 is returned.
+        """
         try:
-            query = update(models.Users).where(models.Users.user_id == user_id).values(kwargs).returning(
-                models.Users.user_id)
+            query = (
+                update(models.Users)
+                .where(models.Users.user_id == user_id)
+                .values(version=models.Users.version + 1, updated_at=func.now(), **kwargs)
+                .returning(models.Users.user_id, models.Users.version)
+                .execution_options(synchronize_session=False)
+            )
+            if expected_versions is not None:
+                query = query.where(models.Users.version.in_(expected_versions))
             result = await self.db_session.execute(query)
+            updated_user = result.first()
+            if updated_user is None:
+                return await self._update_failure(user_id=user_id, expected_versions=expected_versions)
+            if settings.OUTBOX_ENABLED:
+                self.db_session.add(user_event(
+                    USER_UPDATED, updated_user.user_id, user_event_payload(dict(kwargs, version=updated_user.version))
+                ))
             await self.db_session.commit()
-            update_user_id = result.fetchone()
-            if update_user_id is not None:
-                logger.info(f"Success update user data by id {update_user_id[0]}")
-                return UserIdResponse(user_id=update_user_id[0])
-            else:
-                return HTTPException(status_code=404, detail=f"User with id {user_id} not found.")
+            if "user_email" in kwargs:
+                known_emails.add(kwargs["user_email"])
+            await self.cache.set_many_if_newer(
+                {self._user_cache_key(updated_user.user_id): _tombstone(updated_user.version)},
+                expire=settings.USER_CACHE_EXPIRE_SECONDS
+            )
+            logger.info(f"Success update user data by id {updated_user.user_id}")
+            return UserVersionResponse(user_id=updated_user.user_id, version=updated_user.version)
+        except IntegrityError as ex:
+            return db_error_response(ex, f"Error while update user by id = {user_id}: email already exists")
         except Exception as ex:
-            error_message = f"Error while update user by id = {user_id}: {ex}"
-            logger.error(error_message)
-            return HTTPException(status_code=402, detail=error_message)
-        finally:
-            await self.db_session.close()
+            return db_error_response(ex, f"Error while update user by id = {user_id}")
+
+    async def _update_failure(self, user_id: uuid.UUID, expected_versions: Optional[List[int]]) -> HTTPException:
+        """Tell missing user from version conflict, runs only when update matched no rows."""
+        if expected_versions is not None:
+            result = await self.db_session.execute(
+                select(models.Users.version).where(models.Users.user_id == user_id)
+            )
+            current_version = result.scalar_one_or_none()
+            if current_version is not None:
+                return HTTPException(
+                    status_code=412,
+                    detail=f"User with id {user_id} was changed, current version is {current_version}."
+                )
+        return HTTPException(status_code=404, detail=f"User with id {user_id} not found.")
 
     async def delete_user_by_id(self, user_id) -> Union[UserIdResponse, HTTPException]:
-        """Delete data about user from db by id."""
+        """Delete data about user from db by id with single DELETE ... RETURNING statement."""
         try:
-            query = select(models.Users).where(models.Users.user_id == user_id)
-            try:
-                result = await self.db_session.execute(query)
-                selected_user = result.scalar_one()
-                await self.db_session.delete(selected_user)
-                await self.db_session.commit()
-                logger.info(f"Success deleted user's info by id {selected_user.user_id}")
-                return UserIdResponse(user_id=selected_user.user_id)
-            except Exception as ex:
-                error_message = f"User not found with id {user_id}: {ex}"
-                logger.error(error_message)
-                return HTTPException(status_code=404, detail=error_message)
-            finally:
-                await self.db_session.close()
-
+            query = (
+                delete(models.Users)
+                .where(models.Users.user_id == user_id)
+                .returning(models.Users.user_id, models.Users.version)
+                .execution_options(synchronize_session=False)
+            )
+            result = await self.db_session.execute(query)
+            deleted_user = result.first()
+            if deleted_user is None:
+                return HTTPException(status_code=404, detail=f"User with id {user_id} not found.")
+            deleted_user_id = deleted_user.user_id
+            if settings.OUTBOX_ENABLED:
+                self.db_session.add(user_event(USER_DELETED, deleted_user_id, {}))
+            await self.db_session.commit()
+            # tombstone is newer than any version of deleted user
+            await self.cache.set_many_if_newer(
+                {self._user_cache_key(deleted_user_id): _tombstone(deleted_user.version + 1)},
+                expire=settings.USER_CACHE_EXPIRE_SECONDS
+            )
+            logger.info(f"Success deleted user's info by id {deleted_user_id}")
+            return UserIdResponse(user_id=deleted_user_id)
         except Exception as ex:
-            error_message = f"Error while delete user by id = {user_id}: {ex}"
-            logger.error(error_message)
-            return HTTPException(status_code=402, detail=error_message)
+            return db_error_response(ex, f"Error while delete user by id = {user_id}")
 
 
-@lru_cache()
 def get_users_service(
-        db_session: AsyncSession = Depends(get_db)
-) -> UsersService:
-    return UsersService(db=db_session)
+        db_session: AsyncSession = Depends(get_db),
+        cache: CacheStorage = Depends(get_cache_storage)
+) -> Union[UsersService, InMemoryUsersService]:
+    if settings.USERS_REPOSITORY == "memory":
+        return InMemoryUsersService(storage=in_memory_users_storage)
+    return UsersService(db=db_session, cache=cache)
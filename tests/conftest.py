@@ -0,0 +1,96 @@
+import asyncio
+import os
+from typing import Iterator
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.endpoints import LOGIN_PREFIX, USERS_PREFIX, AsgiClient
+from src.api.v1.users.login_handler import login_router
+from src.api.v1.users.routers_users import users_router
+from src.core.config import settings
+from src.db import pg_session
+from src.db.migrate import migrate
+from src.pkg.cache_storage import storage
+from src.pkg.cache_storage.memory_storage import InMemoryStorage
+from src.pkg.hashing import hashing
+from src.pkg.rate_limit import storage as rate_limit_storage
+from src.pkg.rate_limit.memory_storage import InMemoryRateLimitStorage
+from src.services.memory_users import in_memory_users_storage
+
+# tables of this database are dropped and created again, never point it to real data
+TEST_CONNECTION_STRING = os.environ.get("API_STORE_TEST_CONNECTION_STRING")
+
+
+@pytest.fixture(scope="session")
+def pg_connection_string() -> str:
+    """Connection string of test database with freshly migrated schema."""
+    if not TEST_CONNECTION_STRING:
+        pytest.skip("API_STORE_TEST_CONNECTION_STRING is not set")
+
+    async def prepare():
+        db_engine = create_async_engine(TEST_CONNECTION_STRING)
+        try:
+            async with db_engine.begin() as connection:
+                await connection.execute(text("DROP TABLE IF EXISTS outbox_events, users"))
+            await migrate(db_engine)
+        finally:
+            await db_engine.dispose()
+
+    asyncio.run(prepare())
+    return TEST_CONNECTION_STRING
+
+
+@pytest.fixture
+def run_with_db(pg_connection_string):
+    """Runner of async scenario with db engine and hashing pool set up like on app startup."""
+
+    def run(scenario) -> None:
+        async def wrapper():
+            pg_session.engine = pg_session.create_engine(pg_connection_string)
+            pg_session.SessionLocal = sessionmaker(
+                bind=pg_session.engine,
+                expire_on_commit=False,
+                class_=AsyncSession,
+                sync_session_class=pg_session.RoutingSession,
+                autocommit=False,
+                autoflush=False
+            )
+            hashing.configure_hashing_policy(rounds=4)
+            hashing.hashing_pool = hashing.HashingPool(max_workers=1)
+            try:
+                await scenario()
+            finally:
+                hashing.hashing_pool.shutdown()
+                hashing.hashing_pool = None
+                await pg_session.engine.dispose()
+                pg_session.engine = None
+                pg_session.SessionLocal = None
+
+        asyncio.run(wrapper())
+
+    return run
+
+
+@pytest.fixture
+def api_client(monkeypatch) -> Iterator[AsgiClient]:
+    """Client of users and login api with users kept in memory, runs without database and redis."""
+    monkeypatch.setattr(settings, "USERS_REPOSITORY", "memory")
+    monkeypatch.setattr(storage, "cache_storage", InMemoryStorage())
+    monkeypatch.setattr(rate_limit_storage, "rate_limit_storage", InMemoryRateLimitStorage())
+    hashing.configure_hashing_policy(rounds=4)
+    monkeypatch.setattr(hashing, "hashing_pool", hashing.HashingPool(max_workers=1))
+    in_memory_users_storage.clear()
+
+    app = FastAPI(default_response_class=ORJSONResponse)
+    app.include_router(users_router, prefix=USERS_PREFIX)
+    app.include_router(login_router, prefix=LOGIN_PREFIX)
+    # memory repository does not use session of request
+    app.dependency_overrides[pg_session.get_db] = lambda: None
+    yield AsgiClient(app)
+    hashing.hashing_pool.shutdown()
+    in_memory_users_storage.clear()
@@ -0,0 +1,62 @@
+import asyncio
+import datetime
+
+import orjson
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import insert
+from starlette.requests import Request
+
+from benchmarks.endpoints import USERS_PREFIX, _new_user
+from src.api.v1.users.resp_models import CreateUserRequest
+from src.api.v1.users.routers_users import _iterate_ndjson_users
+from src.core.config import MAX_QUERY_PARAMETERS, settings
+from src.pkg.storage import models
+from src.services.users import _bulk_user_row
+
+
+def test_chunk_of_bulk_create_fits_query_parameters():
+    user = CreateUserRequest(**_new_user())
+    rows = [_bulk_user_row(user, "hash", datetime.datetime.now()) for _ in range(settings.BULK_CREATE_CHUNK_SIZE)]
+    compiled = insert(models.Users).values(rows).compile(dialect=postgresql.dialect())
+    assert len(compiled.params) <= MAX_QUERY_PARAMETERS
+
+
+def _ndjson_request(chunks):
+    messages = [{"type": "http.request", "body": chunk, "more_body": True} for chunk in chunks]
+    messages.append({"type": "http.request", "body": b"", "more_body": False})
+
+    async def receive():
+        return messages.pop(0)
+
+    return Request({"type": "http", "method": "POST", "headers": []}, receive)
+
+
+def test_ndjson_lines_are_parsed_across_body_chunks():
+    async def scenario():
+        first, second = orjson.dumps(_new_user()), orjson.dumps(_new_user())
+        body = first + b"\n\nnot json\n" + second
+        chunks = [body[start:start + 7] for start in range(0, len(body), 7)]
+        return [item async for item in _iterate_ndjson_users(_ndjson_request(chunks))]
+
+    users = asyncio.run(scenario())
+    assert [index for index, _ in users] == [0, 1, 2]
+    assert isinstance(users[0][1], CreateUserRequest)
+    assert isinstance(users[1][1], str)
+    assert isinstance(users[2][1], CreateUserRequest)
+
+
+def test_ndjson_upload_creates_users(api_client):
+    body = b"\n".join(orjson.dumps(_new_user()) for _ in range(3))
+    status_code, response = asyncio.run(api_client.request(
+        "POST", f"{USERS_PREFIX}/bulk_create/ndjson", body=body, headers={"content-type": "application/x-ndjson"}
+    ))
+    assert status_code == 200
+    assert orjson.loads(response)["created"] == 3
+
+
+def test_ndjson_line_over_limit_is_rejected(api_client):
+    body = orjson.dumps(dict(_new_user(), name="x" * settings.BULK_CREATE_MAX_LINE_BYTES))
+    status_code, _ = asyncio.run(api_client.request(
+        "POST", f"{USERS_PREFIX}/bulk_create/ndjson", body=body, headers={"content-type": "application/x-ndjson"}
+    ))
+    assert status_code == 413
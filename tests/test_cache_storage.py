@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+from src.pkg.cache_storage.memory_storage import InMemoryStorage
+from src.pkg.cache_storage.storage import CacheStorage, CacheStorageError
+
+KEY = "users:v3:1"
+
+
+def _redis_storage() -> CacheStorage:
+    aioredis = pytest.importorskip("fakeredis.aioredis")
+    pytest.importorskip("lupa")
+    from src.pkg.cache_storage.redis_storage import RedisStorage
+    return RedisStorage(redis=aioredis.FakeRedis())
+
+
+@pytest.fixture(params=["memory", "redis"])
+def storage(request) -> CacheStorage:
+    if request.param == "redis":
+        return _redis_storage()
+    return InMemoryStorage()
+
+
+def test_set_if_newer_keeps_newer_version(storage):
+    async def scenario():
+        await storage.set_many_if_newer({KEY: b'2:{"version":2}'}, expire=60)
+        await storage.set_many_if_newer({KEY: b'1:{"version":1}'}, expire=60)
+        assert await storage.get(KEY) == b'2:{"version":2}'
+        await storage.set_many_if_newer({KEY: b'3:{"version":3}'}, expire=60)
+        assert await storage.get(KEY) == b'3:{"version":3}'
+
+    asyncio.run(scenario())
+
+
+def test_tombstone_blocks_older_and_is_replaced_by_same_version(storage):
+    async def scenario():
+        await storage.set_many_if_newer({KEY: b'1:{"version":1}'}, expire=60)
+        # update to version 2 writes tombstone over cached version 1
+        await storage.set_many_if_newer({KEY: b"2:"}, expire=60)
+        assert await storage.get(KEY) == b"2:"
+        # lookup that read the row before update comes back late
+        await storage.set_many_if_newer({KEY: b'1:{"version":1}'}, expire=60)
+        assert await storage.get(KEY) == b"2:"
+        await storage.set_many_if_newer({KEY: b'2:{"version":2}'}, expire=60)
+        assert await storage.get(KEY) == b'2:{"version":2}'
+        # tombstone of the same version does not drop cached payload
+        await storage.set_many_if_newer({KEY: b"2:"}, expire=60)
+        assert await storage.get(KEY) == b'2:{"version":2}'
+
+    asyncio.run(scenario())
+
+
+def test_redis_strict_set_many_raises_when_redis_is_down():
+    aioredis = pytest.importorskip("fakeredis.aioredis")
+    fakeredis = pytest.importorskip("fakeredis")
+    from src.pkg.cache_storage.redis_storage import RedisStorage
+
+    async def scenario():
+        server = fakeredis.FakeServer()
+        server.connected = False
+        storage = RedisStorage(redis=aioredis.FakeRedis(server=server))
+        await storage.set_many({KEY: b"value"}, expire=60)
+        with pytest.raises(CacheStorageError):
+            await storage.set_many({KEY: b"value"}, expire=60, raise_errors=True)
+
+    asyncio.run(scenario())
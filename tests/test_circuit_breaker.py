@@ -0,0 +1,80 @@
+import pytest
+from sqlalchemy import exc, text
+
+from src.db import pg_session
+from src.db.pg_session import db_error_response
+from src.pkg.circuit_breaker import circuit_breaker
+from src.pkg.circuit_breaker.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_circuit_opens_after_failures_in_row(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_seconds=10)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CLOSED and breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow_request()
+    assert breaker.retry_after() == 10
+
+
+def test_half_open_circuit_lets_one_trial_request(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=10)
+    breaker.record_failure()
+    clock[0] += 10
+    assert breaker.allow_request() and breaker.state == HALF_OPEN
+    # next trial waits for another reset period
+    assert not breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CLOSED and breaker.failures == 0 and breaker.allow_request()
+
+
+def test_failed_trial_opens_circuit_again(clock):
+    breaker = CircuitBreaker(failure_threshold=5, reset_seconds=10)
+    for _ in range(5):
+        breaker.record_failure()
+    clock[0] += 10
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == OPEN and not breaker.allow_request()
+    assert breaker.status() == {"state": OPEN, "failures": 6, "retry_after": 10}
+
+
+class _DriverError(Exception):
+    def __init__(self, sqlstate):
+        super().__init__("secret driver message")
+        self.sqlstate = sqlstate
+
+
+def test_db_errors_do_not_echo_driver_message():
+    timeout = db_error_response(
+        exc.DBAPIError("SELECT 1", {}, _DriverError("57014")), "Error while select user"
+    )
+    assert timeout.status_code == 504 and int(timeout.headers["Retry-After"]) >= 1
+    pool_timeout = db_error_response(exc.TimeoutError("QueuePool limit reached"), "Error while select user")
+    assert pool_timeout.status_code == 503 and int(pool_timeout.headers["Retry-After"]) >= 1
+    other = db_error_response(exc.DBAPIError("SELECT 1", {}, _DriverError("42P01")), "Error while select user")
+    assert other.status_code == 402 and other.detail == "Error while select user"
+    for response in (timeout, pool_timeout, other):
+        assert "secret" not in response.detail
+
+
+def test_statement_timeout_is_mapped_to_504(run_with_db):
+    async def scenario():
+        async with pg_session.SessionLocal() as db_session:
+            await db_session.execute(text("SET LOCAL statement_timeout = 10"))
+            with pytest.raises(exc.DBAPIError) as error:
+                await db_session.execute(text("SELECT pg_sleep(1)"))
+        assert db_error_response(error.value, "Error while sleep").status_code == 504
+
+    run_with_db(scenario)
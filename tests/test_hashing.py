@@ -0,0 +1,31 @@
+import pytest
+from pydantic import ValidationError
+
+from src.core.config import PASSWORD_HASH_ROUNDS_FLOOR, Settings, settings
+from src.pkg.hashing import hashing
+
+
+def test_hash_rounds_are_not_below_floor():
+    assert PASSWORD_HASH_ROUNDS_FLOOR == 12
+    assert settings.PASSWORD_HASH_MIN_ROUNDS >= PASSWORD_HASH_ROUNDS_FLOOR
+    with pytest.raises(ValidationError):
+        Settings(PASSWORD_HASH_MIN_ROUNDS=10)
+    with pytest.raises(ValidationError):
+        Settings(PASSWORD_HASH_ROUNDS=11)
+    assert Settings(PASSWORD_HASH_ROUNDS=13).PASSWORD_HASH_ROUNDS == 13
+
+
+def test_calibration_does_not_go_below_min_rounds():
+    assert hashing.calibrate_bcrypt_rounds(target_seconds=0, min_rounds=4, max_rounds=6) == 4
+
+
+def test_hash_weaker_than_policy_is_upgraded_on_login():
+    weak_hash = hashing.pwd_context.handler("bcrypt").using(rounds=4).hash("password")
+    policy = hashing.pwd_context.to_dict()
+    try:
+        hashing.configure_hashing_policy(rounds=5)
+        is_valid, new_hash = hashing._verify_and_update("password", weak_hash)
+        assert is_valid and new_hash is not None
+        assert hashing.pwd_context.handler("bcrypt").from_string(new_hash).rounds == 5
+    finally:
+        hashing.pwd_context.load(policy)
@@ -0,0 +1,43 @@
+import uuid
+
+from sqlalchemy import func, update
+
+from src.db import pg_session
+from src.pkg.cache_storage.memory_storage import InMemoryStorage
+from src.pkg.storage import models
+from src.services.known_emails import KnownEmails
+from src.services.users import UsersService
+
+
+def test_refresh_adds_email_changed_by_other_worker(run_with_db):
+    async def scenario():
+        async with pg_session.SessionLocal() as db_session:
+            users_service = UsersService(db=db_session, cache=InMemoryStorage())
+            created = await users_service.create_user(
+                name="Ivan",
+                lastname=None,
+                surname="Petrov",
+                country="RU",
+                user_email=f"old-{uuid.uuid4().hex}@example.com",
+                user_password="password",
+            )
+        worker_emails = KnownEmails()
+        await worker_emails.rebuild()
+
+        # user registered long ago changes email on other worker
+        new_email = f"new-{uuid.uuid4().hex}@example.com"
+        async with pg_session.SessionLocal() as db_session:
+            await db_session.execute(
+                update(models.Users)
+                .where(models.Users.user_id == created.user_id)
+                .values(date_registration=func.now() - func.make_interval(0, 0, 0, 1))
+            )
+            await db_session.commit()
+            other_worker = UsersService(db=db_session, cache=InMemoryStorage())
+            await other_worker.update_user_by_id(user_id=created.user_id, user_email=new_email)
+        assert not worker_emails.might_exist(new_email)
+
+        await worker_emails.refresh()
+        assert worker_emails.might_exist(new_email)
+
+    run_with_db(scenario)
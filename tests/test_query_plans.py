@@ -0,0 +1,98 @@
+"""EXPLAIN checks of hot queries, they fail when query stops using index and scans users table.
+
+Sequential scans are disabled for the session, so planner picks them only
+when no index can serve the query, small test table does not hide missing index.
+"""
+import asyncio
+import datetime
+import json
+import uuid
+from typing import List
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.services.auth_users import _user_by_email_query
+from src.services.users import _search_users_query, _users_page_query
+
+CURSOR_KEY = (datetime.datetime(2023, 1, 1, tzinfo=datetime.timezone.utc), uuid.uuid4())
+
+
+def _plan_nodes(plan: dict) -> List[dict]:
+    nodes = [plan]
+    for child in plan.get("Plans", []):
+        nodes.extend(_plan_nodes(child))
+    return nodes
+
+
+def _explain(connection_string: str, query, setup: str = "") -> List[dict]:
+    async def scenario():
+        db_engine = create_async_engine(connection_string)
+        try:
+            async with db_engine.connect() as connection:
+                await connection.execute(text("SET enable_seqscan = off"))
+                if setup:
+                    await connection.execute(text(setup))
+                compiled = query.compile(dialect=connection.dialect)
+                params = tuple(compiled.params[name] for name in compiled.positiontup)
+                result = await connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", params)
+                plan = result.scalar()
+        finally:
+            await db_engine.dispose()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return _plan_nodes(plan[0]["Plan"])
+
+    return asyncio.run(scenario())
+
+
+def _has_extension(connection_string: str, name: str) -> bool:
+    async def scenario():
+        db_engine = create_async_engine(connection_string)
+        try:
+            async with db_engine.connect() as connection:
+                result = await connection.execute(text("SELECT 1 FROM pg_extension WHERE extname = :name"), {"name": name})
+                return result.first() is not None
+        finally:
+            await db_engine.dispose()
+
+    return asyncio.run(scenario())
+
+
+def _assert_uses_index(nodes: List[dict], index_name: str) -> None:
+    seq_scans = [node for node in nodes if node["Node Type"] == "Seq Scan" and node.get("Relation Name") == "users"]
+    assert not seq_scans, f"users table is scanned: {nodes}"
+    assert index_name in {node.get("Index Name") for node in nodes}, f"{index_name} is not used: {nodes}"
+
+
+def test_login_lookup_by_lower_email_uses_index(pg_connection_string):
+    nodes = _explain(pg_connection_string, _user_by_email_query("user@example.com"))
+    _assert_uses_index(nodes, "ix_users_user_email_lower")
+
+
+@pytest.mark.parametrize("cursor_key", [None, CURSOR_KEY])
+def test_users_page_uses_keyset_index(pg_connection_string, cursor_key):
+    query = _users_page_query(cursor_key=cursor_key, country=None, consent_to_mailing=None).limit(51)
+    _assert_uses_index(_explain(pg_connection_string, query), "ix_users_date_registration_user_id")
+
+
+@pytest.mark.parametrize("cursor_key", [None, CURSOR_KEY])
+def test_users_page_by_country_uses_index(pg_connection_string, cursor_key):
+    query = _users_page_query(cursor_key=cursor_key, country="RU", consent_to_mailing=None).limit(51)
+    _assert_uses_index(_explain(pg_connection_string, query), "ix_users_country_date_registration_user_id")
+
+
+@pytest.mark.parametrize("cursor_key", [None, CURSOR_KEY])
+def test_users_page_by_consent_uses_index(pg_connection_string, cursor_key):
+    query = _users_page_query(cursor_key=cursor_key, country=None, consent_to_mailing=True).limit(51)
+    _assert_uses_index(_explain(pg_connection_string, query), "ix_users_consent_date_registration_user_id")
+
+
+def test_users_search_uses_trigram_indexes(pg_connection_string):
+    if not _has_extension(pg_connection_string, "pg_trgm"):
+        pytest.skip("pg_trgm is not installed in test database")
+    query, _ = _search_users_query("iva")
+    nodes = _explain(pg_connection_string, query.limit(21))
+    for column_name in ("name", "surname", "lastname", "country"):
+        _assert_uses_index(nodes, f"ix_users_{column_name}_trgm")
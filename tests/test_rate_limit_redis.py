@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+
+aioredis = pytest.importorskip("fakeredis.aioredis")
+pytest.importorskip("lupa")
+
+from src.pkg.rate_limit.redis_storage import RedisRateLimitStorage  # noqa: E402
+
+KEY = "login:account:user@example.com"
+
+
+def _storage() -> RedisRateLimitStorage:
+    return RedisRateLimitStorage(redis=aioredis.FakeRedis())
+
+
+def test_failures_lock_key_that_has_bucket():
+    async def scenario():
+        storage = _storage()
+        assert await storage.consume(KEY, capacity=5, refill_per_second=0.1) == 0
+        lockouts = [
+            await storage.register_failure(KEY, threshold=3, base_seconds=1.0, max_seconds=60.0, window_seconds=60)
+            for _ in range(4)
+        ]
+        assert lockouts == [0.0, 0.0, 1.0, 2.0]
+        assert await storage.get_lockout(KEY) > 1.0
+
+    asyncio.run(scenario())
+
+
+def test_reset_failures_keeps_bucket():
+    async def scenario():
+        storage = _storage()
+        assert await storage.consume(KEY, capacity=2, refill_per_second=0.001) == 0
+        for _ in range(3):
+            await storage.register_failure(KEY, threshold=3, base_seconds=1.0, max_seconds=60.0, window_seconds=60)
+        await storage.reset_failures(KEY)
+        assert await storage.get_lockout(KEY) == 0
+        assert await storage.consume(KEY, capacity=2, refill_per_second=0.001) == 0
+        assert await storage.consume(KEY, capacity=2, refill_per_second=0.001) > 0
+        assert await storage.register_failure(
+            KEY, threshold=3, base_seconds=1.0, max_seconds=60.0, window_seconds=60
+        ) == 0
+
+    asyncio.run(scenario())
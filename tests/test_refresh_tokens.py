@@ -0,0 +1,113 @@
+import asyncio
+import datetime
+import uuid
+
+from fastapi import HTTPException
+
+from src.api.v1.users.resp_models import Token
+from src.pkg.cache_storage.memory_storage import InMemoryStorage
+from src.pkg.cache_storage.storage import CacheStorageError
+from src.security.tokens import UserTokens
+from src.services.memory_users import InMemoryUsersService, InMemoryUsersStorage
+from src.services.refresh_tokens import RefreshTokens
+
+
+def _refresh_tokens_of_user():
+    users_storage = InMemoryUsersStorage()
+    user_id = uuid.uuid4()
+    users_storage.insert({
+        "user_id": user_id,
+        "name": "Ivan",
+        "lastname": None,
+        "surname": "Petrov",
+        "country": "RU",
+        "user_email": "ivan@example.com",
+        "date_registration": datetime.datetime.now(datetime.timezone.utc),
+        "consent_to_mailing": False,
+        "version": 1,
+    })
+    refresh_tokens = RefreshTokens(store=InMemoryStorage(), users_service=InMemoryUsersService(storage=users_storage))
+    return refresh_tokens, users_storage, user_id
+
+
+def test_refresh_rotates_token_of_existing_user():
+    async def scenario():
+        refresh_tokens, _, user_id = _refresh_tokens_of_user()
+        tokens = await refresh_tokens.issue_tokens(user_id=user_id, user_email="ivan@example.com")
+        renewed = await refresh_tokens.refresh(tokens.refresh_token)
+        assert type(renewed) == Token
+        reused = await refresh_tokens.refresh(tokens.refresh_token)
+        assert type(reused) == HTTPException and reused.status_code == 401
+
+    asyncio.run(scenario())
+
+
+def test_refresh_rejects_token_of_deleted_user():
+    async def scenario():
+        refresh_tokens, users_storage, user_id = _refresh_tokens_of_user()
+        tokens = await refresh_tokens.issue_tokens(user_id=user_id, user_email="ivan@example.com")
+        users_storage.delete(user_id)
+        result = await refresh_tokens.refresh(tokens.refresh_token)
+        assert type(result) == HTTPException and result.status_code == 401
+
+    asyncio.run(scenario())
+
+
+def test_refresh_issues_tokens_with_current_email():
+    async def scenario():
+        refresh_tokens, users_storage, user_id = _refresh_tokens_of_user()
+        tokens = await refresh_tokens.issue_tokens(user_id=user_id, user_email="ivan@example.com")
+        users_storage.update(user_id, {"user_email": "petr@example.com", "version": 2})
+        renewed = await refresh_tokens.refresh(tokens.refresh_token)
+        assert type(renewed) == Token
+        assert UserTokens.decode_access_token(renewed.access_token).user_email == "petr@example.com"
+        assert UserTokens.decode_refresh_token(renewed.refresh_token)["sub"] == "petr@example.com"
+
+    asyncio.run(scenario())
+
+
+def test_reused_refresh_token_revokes_its_family():
+    async def scenario():
+        refresh_tokens, _, user_id = _refresh_tokens_of_user()
+        stolen = await refresh_tokens.issue_tokens(user_id=user_id, user_email="ivan@example.com")
+        other_session = await refresh_tokens.issue_tokens(user_id=user_id, user_email="ivan@example.com")
+        renewed = await refresh_tokens.refresh(stolen.refresh_token)
+        assert type(renewed) == Token
+        reused = await refresh_tokens.refresh(stolen.refresh_token)
+        assert type(reused) == HTTPException and reused.status_code == 401
+        # token renewed by legitimate client belongs to revoked family
+        result = await refresh_tokens.refresh(renewed.refresh_token)
+        assert type(result) == HTTPException and result.status_code == 401
+        assert type(await refresh_tokens.refresh(other_session.refresh_token)) == Token
+
+    asyncio.run(scenario())
+
+
+def test_revoked_refresh_token_ends_its_family():
+    async def scenario():
+        refresh_tokens, _, user_id = _refresh_tokens_of_user()
+        tokens = await refresh_tokens.issue_tokens(user_id=user_id, user_email="ivan@example.com")
+        renewed = await refresh_tokens.refresh(tokens.refresh_token)
+        assert await refresh_tokens.revoke(renewed.refresh_token) is None
+        result = await refresh_tokens.refresh(renewed.refresh_token)
+        assert type(result) == HTTPException and result.status_code == 401
+
+    asyncio.run(scenario())
+
+
+class _FailingStorage(InMemoryStorage):
+    async def set_many(self, values, expire, raise_errors=False):
+        if raise_errors:
+            raise CacheStorageError("store is down")
+
+
+def test_tokens_are_not_issued_when_refresh_token_is_not_saved():
+    async def scenario():
+        _, users_storage, user_id = _refresh_tokens_of_user()
+        refresh_tokens = RefreshTokens(
+            store=_FailingStorage(), users_service=InMemoryUsersService(storage=users_storage)
+        )
+        result = await refresh_tokens.issue_tokens(user_id=user_id, user_email="ivan@example.com")
+        assert type(result) == HTTPException and result.status_code == 503
+
+    asyncio.run(scenario())
@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from src.pkg.coalescing.single_flight import SingleFlight
+
+
+def test_concurrent_callers_share_one_call():
+    async def scenario():
+        single_flight = SingleFlight()
+        calls = []
+
+        async def load():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return len(calls)
+
+        results = await asyncio.gather(*(single_flight.do("key", load) for _ in range(5)))
+        assert results == [1] * 5 and len(calls) == 1
+        # finished call is forgotten, next caller starts new one
+        assert await single_flight.do("key", load) == 2
+
+    asyncio.run(scenario())
+
+
+def test_error_is_raised_to_every_caller():
+    async def scenario():
+        single_flight = SingleFlight()
+
+        async def load():
+            await asyncio.sleep(0.01)
+            raise ValueError("db is down")
+
+        results = await asyncio.gather(*(single_flight.do("key", load) for _ in range(3)), return_exceptions=True)
+        assert all(type(result) == ValueError for result in results)
+
+    asyncio.run(scenario())
+
+
+def test_caller_joining_after_all_callers_cancelled_starts_new_call():
+    async def scenario():
+        single_flight = SingleFlight()
+        started = []
+
+        async def load():
+            started.append(1)
+            try:
+                await asyncio.sleep(0.05)
+            except asyncio.CancelledError:
+                # cleanup keeps cancelled task running for a while
+                await asyncio.sleep(0.01)
+                raise
+            return len(started)
+
+        first = asyncio.ensure_future(single_flight.do("key", load))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        # cancelled task has not finished yet
+        assert await single_flight.do("key", load) == 2
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_caller_does_not_cancel_call_of_others():
+    async def scenario():
+        single_flight = SingleFlight()
+
+        async def load():
+            await asyncio.sleep(0.01)
+            return "user"
+
+        first = asyncio.ensure_future(single_flight.do("key", load))
+        second = asyncio.ensure_future(single_flight.do("key", load))
+        await asyncio.sleep(0)
+        first.cancel()
+        assert await second == "user"
+
+    asyncio.run(scenario())
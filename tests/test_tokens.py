@@ -0,0 +1,78 @@
+import asyncio
+import time
+import uuid
+from urllib.parse import urlencode
+
+import orjson
+
+from benchmarks.endpoints import LOGIN_PREFIX, USERS_PREFIX, _new_user
+from src.api.v1.users.resp_models import TokenClaims
+from src.security import tokens
+from src.security.tokens import TokenClaimsCache
+
+
+def _claims(exp: float) -> TokenClaims:
+    return TokenClaims(user_id=uuid.uuid4(), user_email="ivan@example.com", exp=int(exp))
+
+
+def test_claims_cache_evicts_least_recently_used_token():
+    cache = TokenClaimsCache(max_size=2, ttl=60)
+    exp = time.time() + 3600
+    cache.set("first", _claims(exp))
+    cache.set("second", _claims(exp))
+    assert cache.get("first") is not None
+    cache.set("third", _claims(exp))
+    assert cache.get("second") is None
+    assert cache.get("first") is not None and cache.get("third") is not None
+
+
+def test_claims_cache_entry_expires_after_ttl(monkeypatch):
+    now = time.time()
+    monkeypatch.setattr(tokens.time, "time", lambda: now)
+    cache = TokenClaimsCache(max_size=10, ttl=60)
+    cache.set("token", _claims(now + 3600))
+    monkeypatch.setattr(tokens.time, "time", lambda: now + 59)
+    assert cache.get("token") is not None
+    monkeypatch.setattr(tokens.time, "time", lambda: now + 60)
+    assert cache.get("token") is None
+
+
+def test_claims_cache_entry_expires_with_token_before_ttl(monkeypatch):
+    now = time.time()
+    monkeypatch.setattr(tokens.time, "time", lambda: now)
+    cache = TokenClaimsCache(max_size=10, ttl=60)
+    cache.set("token", _claims(now + 10))
+    monkeypatch.setattr(tokens.time, "time", lambda: now + 10)
+    assert cache.get("token") is None
+
+
+def test_current_user_is_read_from_access_token(api_client, monkeypatch):
+    monkeypatch.setattr(tokens, "token_claims_cache", TokenClaimsCache(max_size=10, ttl=60))
+
+    async def scenario():
+        user = _new_user()
+        status_code, body = await api_client.request(
+            "POST", f"{USERS_PREFIX}/create", body=orjson.dumps(user), headers={"content-type": "application/json"}
+        )
+        assert status_code == 200, body
+        user_id = orjson.loads(body)["user_id"]
+        form = urlencode({"username": user["user_email"], "password": user["user_pass"]})
+        status_code, body = await api_client.request(
+            "POST",
+            f"{LOGIN_PREFIX}/token",
+            body=form.encode(),
+            headers={"content-type": "application/x-www-form-urlencoded"}
+        )
+        assert status_code == 200, body
+        headers = {"authorization": f"Bearer {orjson.loads(body)['access_token']}"}
+        for _ in range(2):
+            status_code, body = await api_client.request("GET", f"{LOGIN_PREFIX}/me", headers=headers)
+            assert status_code == 200, body
+            claims = orjson.loads(body)
+            assert claims["user_id"] == user_id and claims["user_email"] == user["user_email"]
+        status_code, _ = await api_client.request("GET", f"{LOGIN_PREFIX}/me", headers={"authorization": "Bearer x"})
+        assert status_code == 401
+        status_code, _ = await api_client.request("GET", f"{LOGIN_PREFIX}/me")
+        assert status_code == 401
+
+    asyncio.run(scenario())
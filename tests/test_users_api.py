@@ -0,0 +1,49 @@
+import asyncio
+import uuid
+
+import orjson
+
+from benchmarks.endpoints import USERS_PREFIX, _create_user, _new_user
+
+
+def test_read_batch_keeps_request_order_and_reports_misses(api_client):
+    async def scenario():
+        first_id, _ = await _create_user(api_client)
+        second_id, _ = await _create_user(api_client)
+        missing_id = str(uuid.uuid4())
+        status_code, body = await api_client.json_request(
+            "POST", f"{USERS_PREFIX}/read_batch", {"user_ids": [second_id, missing_id, first_id]}
+        )
+        return first_id, second_id, missing_id, status_code, orjson.loads(body)
+
+    first_id, second_id, missing_id, status_code, response = asyncio.run(scenario())
+    assert status_code == 200
+    assert [user and user["user_id"] for user in response["users"]] == [second_id, None, first_id]
+    assert response["not_found"] == [missing_id]
+
+
+def test_deleted_user_is_not_read_and_email_is_free_again(api_client):
+    async def scenario():
+        user_id, user_email = await _create_user(api_client)
+        params = {"user_email": user_email}
+        _, body = await api_client.request("GET", f"{USERS_PREFIX}/email_available", params=params)
+        assert orjson.loads(body)["available"] is False
+        status_code, _ = await api_client.request("DELETE", f"{USERS_PREFIX}/delete", params={"user_uuid": user_id})
+        assert status_code == 200
+        status_code, _ = await api_client.request("GET", f"{USERS_PREFIX}/read", params={"user_uuid": user_id})
+        assert status_code == 400
+        _, body = await api_client.request("GET", f"{USERS_PREFIX}/email_available", params=params)
+        assert orjson.loads(body)["available"] is True
+
+    asyncio.run(scenario())
+
+
+def test_bulk_create_reports_duplicates(api_client):
+    user = _new_user()
+    status_code, body = asyncio.run(api_client.json_request(
+        "POST", f"{USERS_PREFIX}/bulk_create", [user, _new_user(), dict(user, name="Other")]
+    ))
+    assert status_code == 200
+    response = orjson.loads(body)
+    assert (response["created"], response["duplicates"]) == (2, 1)
+    assert [result["status"] for result in response["results"]] == ["created", "created", "duplicate"]
@@ -0,0 +1,67 @@
+import asyncio
+import uuid
+
+import orjson
+import pytest
+
+from benchmarks.endpoints import USERS_PREFIX, _create_user
+
+
+async def _update(api_client, user_id: str, if_match: str, name: str = "Petr"):
+    return await api_client.request(
+        "PATCH",
+        f"{USERS_PREFIX}/update",
+        params={"user_uuid": user_id},
+        body=orjson.dumps({"name": name}),
+        headers={"content-type": "application/json", "if-match": if_match}
+    )
+
+
+@pytest.mark.parametrize("if_match", ['W/"1"', '"2", W/"1"', "1", '"x"', '"1'])
+def test_update_without_matching_strong_etag_is_rejected(api_client, if_match):
+    async def scenario():
+        user_id, _ = await _create_user(api_client)
+        status_code, _ = await _update(api_client, user_id, if_match)
+        assert status_code == 412
+        _, body = await api_client.request("GET", f"{USERS_PREFIX}/read", params={"user_uuid": user_id})
+        assert orjson.loads(body)["version"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_update_matches_any_etag_of_list(api_client):
+    async def scenario():
+        user_id, _ = await _create_user(api_client)
+        status_code, body = await _update(api_client, user_id, '"7", W/"3", "1"')
+        assert status_code == 200 and orjson.loads(body)["version"] == 2
+        status_code, _ = await _update(api_client, user_id, '"1"')
+        assert status_code == 412
+
+    asyncio.run(scenario())
+
+
+def test_update_with_star_requires_existing_user(api_client):
+    async def scenario():
+        user_id, _ = await _create_user(api_client)
+        status_code, body = await _update(api_client, user_id, "*")
+        assert status_code == 200 and orjson.loads(body)["version"] == 2
+        status_code, _ = await _update(api_client, str(uuid.uuid4()), "*")
+        assert status_code == 412
+
+    asyncio.run(scenario())
+
+
+def test_read_with_weak_if_none_match_is_not_modified(api_client):
+    async def scenario():
+        user_id, _ = await _create_user(api_client)
+        params = {"user_uuid": user_id}
+        status_code, _ = await api_client.request(
+            "GET", f"{USERS_PREFIX}/read", params=params, headers={"if-none-match": 'W/"1"'}
+        )
+        assert status_code == 304
+        status_code, body = await api_client.request(
+            "GET", f"{USERS_PREFIX}/read", params=params, headers={"if-none-match": '"5", "x"'}
+        )
+        assert status_code == 200 and orjson.loads(body)["version"] == 1
+
+    asyncio.run(scenario())
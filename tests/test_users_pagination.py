@@ -0,0 +1,62 @@
+import asyncio
+
+import orjson
+import pytest
+
+from benchmarks.endpoints import USERS_PREFIX, _create_user
+from src.pkg.pagination.cursor import encode_cursor
+
+GARBAGE_CURSORS = [
+    "not a cursor",
+    encode_cursor({"date": "2023-01-01T00:00:00"}),
+    encode_cursor([]),
+    encode_cursor(["2023-01-01T00:00:00", 5]),
+    encode_cursor([5, "8c1b7f4e-6c8e-4f55-9c1e-2f9b0c6d3a11"]),
+    encode_cursor(["2023-01-01T00:00:00", "not uuid"]),
+    encode_cursor(["yesterday", "8c1b7f4e-6c8e-4f55-9c1e-2f9b0c6d3a11"]),
+    encode_cursor([1.0, [1], "ben"]),
+    encode_cursor([True, None]),
+]
+
+
+@pytest.mark.parametrize("cursor", GARBAGE_CURSORS)
+def test_list_rejects_garbage_cursor(api_client, cursor):
+    status_code, _ = asyncio.run(api_client.request("GET", f"{USERS_PREFIX}/list", params={"cursor": cursor}))
+    assert status_code == 422
+
+
+@pytest.mark.parametrize("cursor", [
+    "2023-01-01T00:00:00+03:00",
+    "2023-01-01T00:00:00",
+])
+def test_list_accepts_cursor_with_or_without_timezone(api_client, cursor):
+    async def scenario():
+        await _create_user(api_client)
+        return await api_client.request(
+            "GET",
+            f"{USERS_PREFIX}/list",
+            params={"cursor": encode_cursor([cursor, "8c1b7f4e-6c8e-4f55-9c1e-2f9b0c6d3a11"])}
+        )
+
+    status_code, body = asyncio.run(scenario())
+    assert status_code == 200
+    assert len(orjson.loads(body)["users"]) == 1
+
+
+def test_list_pages_follow_cursor(api_client):
+    async def scenario():
+        user_ids = [(await _create_user(api_client))[0] for _ in range(5)]
+        listed_ids, cursor = [], None
+        while True:
+            params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+            status_code, body = await api_client.request("GET", f"{USERS_PREFIX}/list", params=params)
+            assert status_code == 200
+            page = orjson.loads(body)
+            listed_ids.extend(user["user_id"] for user in page["users"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return user_ids, listed_ids
+
+    user_ids, listed_ids = asyncio.run(scenario())
+    assert sorted(listed_ids) == sorted(user_ids)
+    assert len(listed_ids) == len(set(listed_ids))
@@ -0,0 +1,165 @@
+import uuid
+
+import orjson
+from fastapi import HTTPException
+from sqlalchemy import event
+
+from src.db import pg_session, replicas
+from src.pkg.cache_storage.memory_storage import InMemoryStorage
+from src.services import users
+from src.services.users import UsersService, _fetch_users_by_ids, _pack_user
+
+
+async def _create_user(users_service: UsersService) -> uuid.UUID:
+    result = await users_service.create_user(
+        name="Ivan",
+        lastname=None,
+        surname="Petrov",
+        country="RU",
+        user_email=f"read-{uuid.uuid4().hex}@example.com",
+        user_password="password",
+    )
+    assert type(result) != HTTPException, result.detail
+    return result.user_id
+
+
+def test_get_user_json_by_id_is_served_from_db_and_cache(run_with_db):
+    async def scenario():
+        async with pg_session.SessionLocal() as db_session:
+            users_service = UsersService(db=db_session, cache=InMemoryStorage())
+            user_id = await _create_user(users_service)
+            selected = await users_service.get_user_json_by_id(user_id)
+            assert type(selected) != HTTPException, selected.detail
+            payload, version = selected
+            assert orjson.loads(payload)["user_id"] == str(user_id)
+            assert version == 1
+            assert await users_service.get_user_json_by_id(user_id) == selected
+            assert await users_service.get_user_version(user_id) == 1
+
+    run_with_db(scenario)
+
+
+def test_read_paths_do_not_check_out_request_session(run_with_db):
+    async def scenario():
+        async with pg_session.SessionLocal() as db_session:
+            user_id = await _create_user(UsersService(db=db_session, cache=InMemoryStorage()))
+        async with pg_session.SessionLocal() as db_session:
+            users_service = UsersService(db=db_session, cache=InMemoryStorage())
+            assert await users_service.get_user_version(user_id) == 1
+            assert await users_service.get_user_version(uuid.uuid4()) is None
+            assert type(await users_service.get_user_json_by_id(user_id)) != HTTPException
+            assert type(await users_service.get_users_json_by_ids([uuid.uuid4()])) != HTTPException
+            # loaders run in own sessions, request would hold second connection otherwise
+            assert not db_session.in_transaction()
+
+    run_with_db(scenario)
+
+
+def test_get_users_json_by_ids_reports_not_found(run_with_db):
+    async def scenario():
+        async with pg_session.SessionLocal() as db_session:
+            users_service = UsersService(db=db_session, cache=InMemoryStorage())
+            user_id = await _create_user(users_service)
+            missing_id = uuid.uuid4()
+            selected = await users_service.get_users_json_by_ids([user_id, missing_id])
+            assert type(selected) != HTTPException, selected.detail
+            response = orjson.loads(selected)
+            assert [user and user["user_id"] for user in response["users"]] == [str(user_id), None]
+            assert response["not_found"] == [str(missing_id)]
+            # second call joins payloads from cache
+            assert await users_service.get_users_json_by_ids([user_id, missing_id]) == selected
+
+    run_with_db(scenario)
+
+
+def test_lookup_started_before_update_does_not_cache_stale_user(run_with_db):
+    async def scenario():
+        async with pg_session.SessionLocal() as db_session:
+            users_service = UsersService(db=db_session, cache=InMemoryStorage())
+            user_id = await _create_user(users_service)
+            stale_users = await _fetch_users_by_ids([user_id])
+            updated = await users_service.update_user_by_id(user_id=user_id, name="Petr")
+            assert updated.version == 2
+            # lookup that selected the row before update puts it to cache after update
+            await users_service.cache.set_many_if_newer(
+                {users_service._user_cache_key(user_id): _pack_user(stale_users[user_id])}, expire=60
+            )
+            payload, version = await users_service.get_user_json_by_id(user_id)
+            assert version == 2 and orjson.loads(payload)["name"] == "Petr"
+            assert await users_service.get_user_json_by_id(user_id) == (payload, version)
+
+            await users_service.delete_user_by_id(user_id)
+            await users_service.cache.set_many_if_newer(
+                {users_service._user_cache_key(user_id): _pack_user(dict(stale_users[user_id], version=2))},
+                expire=60
+            )
+            assert type(await users_service.get_user_json_by_id(user_id)) == HTTPException
+
+    run_with_db(scenario)
+
+
+def _record_replica_statements(pg_connection_string):
+    # replica is the same database, statements sent to it are recorded
+    replica_engine = pg_session.create_engine(pg_connection_string)
+    replica_statements = []
+    event.listen(
+        replica_engine.sync_engine,
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: replica_statements.append(statement)
+    )
+    replicas.replica_set = replicas.ReplicaSet(engines=[replica_engine])
+    return replica_statements
+
+
+def test_cache_misses_are_read_from_replica(pg_connection_string, run_with_db):
+    async def scenario():
+        async with pg_session.SessionLocal() as db_session:
+            user_id = await _create_user(UsersService(db=db_session, cache=InMemoryStorage()))
+        replica_statements = _record_replica_statements(pg_connection_string)
+        try:
+            async with pg_session.SessionLocal() as db_session:
+                users_service = UsersService(db=db_session, cache=InMemoryStorage())
+                assert type(await users_service.get_user_json_by_id(user_id)) != HTTPException
+                assert len(replica_statements) == 1
+                users_service.cache = InMemoryStorage()
+                selected = orjson.loads(await users_service.get_users_json_by_ids([user_id]))
+                assert selected["users"][0]["user_id"] == str(user_id)
+                assert len(replica_statements) == 2
+        finally:
+            await replicas.replica_set.close()
+            replicas.replica_set = None
+
+    run_with_db(scenario)
+
+
+def test_lagging_replica_is_not_served_after_write(pg_connection_string, run_with_db, monkeypatch):
+    lagging_rows = {}
+
+    async def fetch_from_lagging_replica(user_ids):
+        return {user_id: lagging_rows[user_id] for user_id in user_ids if user_id in lagging_rows}
+
+    monkeypatch.setattr(users._replica_users_loader, "load_many", fetch_from_lagging_replica)
+
+    async def scenario():
+        _record_replica_statements(pg_connection_string)
+        try:
+            async with pg_session.SessionLocal() as db_session:
+                users_service = UsersService(db=db_session, cache=InMemoryStorage())
+                # replica has not replayed insert yet
+                user_id = await _create_user(users_service)
+                payload, version = await users_service.get_user_json_by_id(user_id)
+                assert version == 1
+                lagging_rows[user_id] = orjson.loads(payload)
+                # tombstone of update keeps version 1 of replica out
+                await users_service.update_user_by_id(user_id=user_id, name="Petr")
+                payload, version = await users_service.get_user_json_by_id(user_id)
+                assert version == 2 and orjson.loads(payload)["name"] == "Petr"
+                # version from client is newer than replica row
+                users_service.cache = InMemoryStorage()
+                _, version = await users_service.get_user_json_by_id(user_id, min_version=2)
+                assert version == 2
+        finally:
+            await replicas.replica_set.close()
+            replicas.replica_set = None
+
+    run_with_db(scenario)
@@ -0,0 +1,123 @@
+import asyncio
+import uuid
+
+import orjson
+import pytest
+from fastapi import HTTPException
+
+from benchmarks.endpoints import USERS_PREFIX, _new_user
+from src.db import pg_session
+from src.pkg.cache_storage.memory_storage import InMemoryStorage
+from src.pkg.pagination.cursor import encode_cursor
+from src.services import users
+from src.services.users import UsersService
+
+GARBAGE_CURSORS = [
+    "not a cursor",
+    encode_cursor([]),
+    encode_cursor([1.0, [1], "Alexander"]),
+    encode_cursor(["1.0", "8c1b7f4e-6c8e-4f55-9c1e-2f9b0c6d3a11", "Alexander"]),
+    encode_cursor([True, "8c1b7f4e-6c8e-4f55-9c1e-2f9b0c6d3a11", "Alexander"]),
+    encode_cursor([1.0, "not uuid", "Alexander"]),
+    encode_cursor([1.0, "8c1b7f4e-6c8e-4f55-9c1e-2f9b0c6d3a11", None]),
+]
+
+
+async def _create_named_user(api_client, name: str, surname: str = "Mark") -> str:
+    status_code, body = await api_client.json_request(
+        "POST", f"{USERS_PREFIX}/create", dict(_new_user(), name=name, surname=surname)
+    )
+    assert status_code == 200, body
+    return orjson.loads(body)["user_id"]
+
+
+async def _search(api_client, **params):
+    status_code, body = await api_client.request("GET", f"{USERS_PREFIX}/search", params=params)
+    return status_code, orjson.loads(body)
+
+
+def test_search_ranks_prefix_matches_first(api_client):
+    async def scenario():
+        similar_id = await _create_named_user(api_client, "Ivanof")
+        prefix_id = await _create_named_user(api_client, "Ivanovich")
+        await _create_named_user(api_client, "Petr")
+        return similar_id, prefix_id, await _search(api_client, q="Ivanov")
+
+    similar_id, prefix_id, (status_code, page) = asyncio.run(scenario())
+    assert status_code == 200
+    assert [user["user_id"] for user in page["users"]] == [prefix_id, similar_id]
+    assert page["next_cursor"] is None
+
+
+def test_search_pages_follow_cursor(api_client):
+    async def scenario():
+        user_ids = {await _create_named_user(api_client, "Alexander", surname=f"Mark{number}") for number in range(5)}
+        found_ids, cursor = [], None
+        while True:
+            params = {"q": "Alexander", "limit": 2, **({"cursor": cursor} if cursor else {})}
+            status_code, page = await _search(api_client, **params)
+            assert status_code == 200
+            found_ids.extend(user["user_id"] for user in page["users"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return user_ids, found_ids
+
+    user_ids, found_ids = asyncio.run(scenario())
+    assert len(found_ids) == 5 and set(found_ids) == user_ids
+
+
+@pytest.mark.parametrize("params", [{"q": "Iv"}, {"q": "   Iv   "}])
+def test_search_rejects_short_query(api_client, params):
+    status_code, _ = asyncio.run(_search(api_client, **params))
+    assert status_code == 422
+
+
+def test_search_rejects_cursor_of_other_query(api_client):
+    async def scenario():
+        for _ in range(2):
+            await _create_named_user(api_client, "Alexander")
+        _, page = await _search(api_client, q="Alexander", limit=1)
+        return await _search(api_client, q="Alexandr", cursor=page["next_cursor"])
+
+    status_code, _ = asyncio.run(scenario())
+    assert status_code == 422
+
+
+@pytest.mark.parametrize("cursor", GARBAGE_CURSORS)
+def test_search_rejects_garbage_cursor(api_client, cursor):
+    status_code, _ = asyncio.run(_search(api_client, q="Alexander", cursor=cursor))
+    assert status_code == 422
+
+
+def test_db_search_works_with_or_without_pg_trgm(run_with_db, monkeypatch):
+    # extension is checked again, test database may have no pg_trgm
+    monkeypatch.setattr(users, "_has_trigrams", None)
+    name = f"Zor{uuid.uuid4().hex[:8]}"
+
+    async def scenario():
+        async with pg_session.SessionLocal() as db_session:
+            users_service = UsersService(db=db_session, cache=InMemoryStorage())
+            user_ids = set()
+            for _ in range(3):
+                created = await users_service.create_user(
+                    name=name,
+                    lastname=None,
+                    surname="Mark",
+                    country="RU",
+                    user_email=f"search-{uuid.uuid4().hex}@example.com",
+                    user_password="password"
+                )
+                user_ids.add(str(created.user_id))
+            found_ids, cursor = [], None
+            while True:
+                page = await users_service.search_users(search_text=name.lower(), limit=2, cursor=cursor)
+                assert type(page) != HTTPException, page.detail
+                found_ids.extend(str(user.user_id) for user in page.users)
+                cursor = page.next_cursor
+                if cursor is None:
+                    break
+            assert len(found_ids) == 3 and set(found_ids) == user_ids
+            result = await users_service.search_users(search_text=name, limit=2, cursor=GARBAGE_CURSORS[2])
+            assert type(result) == HTTPException and result.status_code == 422
+
+    run_with_db(scenario)